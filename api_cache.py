@@ -0,0 +1,104 @@
+# api_cache.py
+# Caché en memoria (por proceso) de las lecturas de api_client, con claves por usuario y consulta.
+# Las escrituras invalidan solo las claves de ese usuario: nunca hace falta st.cache_data.clear().
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import api_client
+
+# TTL en segundos por grupo de datos
+TTLS = {
+    "fichajes": int(os.getenv("CACHE_TTL_FICHAJES") or 30),
+    "vacaciones": int(os.getenv("CACHE_TTL_VACACIONES") or 300),
+    "bajas": int(os.getenv("CACHE_TTL_BAJAS") or 300),
+}
+MAX_ENTRADAS = int(os.getenv("CACHE_MAX_ENTRADAS") or 5000)
+PURGA_CADA_S = 30   # las claves de un solo uso (páginas por cursor, since_id) caducan sin esperar al LRU
+
+_lock = threading.Lock()
+_datos: "OrderedDict[tuple, tuple[float, object]]" = OrderedDict()  # clave -> (expira, valor)
+_stats = {g: {"hits": 0, "misses": 0, "invalidaciones": 0} for g in TTLS}
+_proxima_purga = 0.0
+
+
+def _clave(user_id, grupo, nombre, args, kwargs) -> tuple:
+    return (str(user_id), grupo, nombre, args, tuple(sorted(kwargs.items())))
+
+def _purgar(ahora: float):
+    """Quita las entradas caducadas (con el lock tomado), como mucho cada PURGA_CADA_S."""
+    global _proxima_purga
+    if ahora < _proxima_purga:
+        return
+    _proxima_purga = ahora + PURGA_CADA_S
+    for k in [k for k, (expira, _) in _datos.items() if expira <= ahora]:
+        del _datos[k]
+
+def cached(grupo: str):
+    """Decora una lectura cuyo primer argumento es user_id. El valor devuelto se comparte: no mutarlo."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(user_id, *args, **kwargs):
+            clave = _clave(user_id, grupo, fn.__name__, args, kwargs)
+            ahora = time.monotonic()
+            with _lock:
+                hit = _datos.get(clave)
+                if hit and hit[0] > ahora:
+                    _datos.move_to_end(clave)
+                    _stats[grupo]["hits"] += 1
+                    return hit[1]
+                _stats[grupo]["misses"] += 1
+            valor = fn(user_id, *args, **kwargs)  # fuera del lock: no bloquear a otros usuarios
+            with _lock:
+                ahora = time.monotonic()
+                _purgar(ahora)
+                _datos[clave] = (ahora + TTLS[grupo], valor)
+                _datos.move_to_end(clave)
+                while len(_datos) > MAX_ENTRADAS:
+                    _datos.popitem(last=False)
+            return valor
+        return wrapper
+    return deco
+
+def invalidar(user_id, *grupos: str) -> int:
+    """Borra las entradas de ese usuario (de los grupos dados o de todos). Devuelve cuántas."""
+    uid = str(user_id)
+    grupos = grupos or tuple(TTLS)
+    with _lock:
+        claves = [k for k in _datos if k[0] == uid and k[1] in grupos]
+        for k in claves:
+            del _datos[k]
+        for g in grupos:
+            _stats[g]["invalidaciones"] += 1
+    return len(claves)
+
+def stats() -> dict:
+    """Contadores por grupo (hits, misses, invalidaciones, hit_ratio) y nº de entradas vivas."""
+    with _lock:
+        out = {}
+        for g, s in _stats.items():
+            total = s["hits"] + s["misses"]
+            out[g] = {**s, "hit_ratio": round(s["hits"] / total, 3) if total else 0.0}
+        out["entradas"] = len(_datos)
+        return out
+
+
+# ---- Lecturas cacheadas (misma firma que api_client) ----
+get_fichajes_page = cached("fichajes")(api_client.get_fichajes_page)
+get_fichajes = cached("fichajes")(api_client.get_fichajes)
+get_vacaciones = cached("vacaciones")(api_client.get_vacaciones)
+get_bajas = cached("bajas")(api_client.get_bajas)
+
+def iter_fichajes(user_id: str, desde=None, hasta=None, page_size: int = 500, since_id: int | None = None):
+    """Como api_client.iter_fichajes, pero cada página pasa por la caché."""
+    cursor = None
+    while True:
+        page = get_fichajes_page(user_id, limit=page_size, desde=desde, hasta=hasta,
+                                 cursor=cursor, since_id=since_id)
+        if page["items"]:
+            yield page["items"]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
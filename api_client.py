@@ -1,20 +1,133 @@
-import os, requests, datetime as dt
+import os, threading, requests, datetime as dt
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 BASE = (os.getenv("BACKEND_BASE_URL") or "http://localhost:8000").rstrip("/")
 
-def _r(method, path, **kw):
-    resp = requests.request(method, f"{BASE}{path}", timeout=30, **kw)
+# ---- Transporte HTTP (pool compartido por todo el proceso) ----
+# Una única Session reutiliza conexiones TCP/TLS (keep-alive) entre reruns y usuarios.
+POOL_SIZE = int(os.getenv("BACKEND_POOL_SIZE") or 20)
+RETRY_TOTAL = int(os.getenv("BACKEND_RETRIES") or 3)
+RETRY_BACKOFF = float(os.getenv("BACKEND_RETRY_BACKOFF") or 0.3)
+
+# (connect, read) en segundos por endpoint; DEFAULT_TIMEOUT para el resto
+DEFAULT_TIMEOUT = (3.05, 30)
+TIMEOUTS = {
+    ("GET", "/fichajes"): (3.05, 10),
+    ("POST", "/fichajes"): (3.05, 15),
+    ("POST", "/fichajes/lote"): (3.05, 30),
+    ("POST", "/fichajes/manual/lote"): (3.05, 30),
+    ("GET", "/vacaciones"): (3.05, 10),
+    ("GET", "/bajas"): (3.05, 10),
+    ("POST", "/bajas"): (3.05, 60),  # multipart con adjuntos
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+def _build_session() -> requests.Session:
+    # Solo reintentamos métodos idempotentes; un POST repetido podría duplicar fichajes
+    retry = Retry(
+        total=RETRY_TOTAL,
+        connect=RETRY_TOTAL,
+        read=RETRY_TOTAL,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE,
+                          pool_block=True, max_retries=retry)
+    s = requests.Session()
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
+
+def get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+def _r(method, path, *, timeout=None, **kw):
+    timeout = timeout or TIMEOUTS.get((method, path), DEFAULT_TIMEOUT)
+    resp = get_session().request(method, f"{BASE}{path}", timeout=timeout, **kw)
     resp.raise_for_status()
     return resp.json() if resp.content else None
 
 # ---- Fichajes ----
-def post_fichaje(user_id: str, empleado: str, tipo: str, observ: str="", fuente="movil"):
+def post_fichaje(user_id: str, empleado: str, tipo: str, observ: str="", fuente="movil",
+                 idempotency_key: str | None = None, fecha_local: str | None = None):
     data = {"user_id": user_id, "empleado": empleado or "", "tipo": tipo,
             "observaciones": observ or "", "fuente": fuente}
-    return _r("POST", "/fichajes", data=data)
+    headers = {}
+    if idempotency_key:
+        # El backend deduplica reenvíos con la misma clave (outbox con reintentos)
+        data["idempotency_key"] = idempotency_key
+        headers["Idempotency-Key"] = idempotency_key
+    if fecha_local:
+        data["fecha_local"] = fecha_local  # hora real del toque, no la del envío
+    return _r("POST", "/fichajes", data=data, headers=headers)
+
+def post_fichajes_lote(items: list[dict]):
+    """
+    Envía varios fichajes en una sola petición. Cada item lleva su idempotency_key.
+    Devuelve {"results": [{"idempotency_key", "ok", "fichaje" | "error"}, ...]}.
+    """
+    return _r("POST", "/fichajes/lote", json={"items": items})
+
+def post_fichajes_manual_lote(user_id: str, empleado: str, pares: list[dict], idempotency_key: str):
+    """
+    Ajustes manuales (pares Entrada/Salida) en una sola petición atómica: o se guardan
+    todos o ninguno. Cada par: {"ref", "entrada_local", "entrada_utc", "salida_local",
+    "salida_utc", "observaciones"}. Devuelve {"ok": bool, "results": [{"ref", "ok",
+    "fichajes" | "error"}, ...]}; si ok es False no se ha guardado nada.
+    """
+    return _r("POST", "/fichajes/manual/lote",
+              json={"user_id": user_id, "empleado": empleado or "", "atomico": True,
+                    "idempotency_key": idempotency_key, "items": pares},
+              headers={"Idempotency-Key": idempotency_key})
+
+def get_fichajes_page(user_id: str, limit: int = 200, desde=None, hasta=None, cursor=None,
+                      since_id: int | None = None) -> dict:
+    """
+    Una página de fichajes. desde/hasta son días locales inclusivos (date o 'YYYY-MM-DD');
+    cursor es el valor opaco 'next_cursor' de la página anterior; since_id pide solo
+    los fichajes con id mayor (sincronización incremental, orden ascendente).
+    Devuelve {"items": [...], "next_cursor": str | None, "paginado": bool}; paginado es
+    False si el backend antiguo ha devuelto una lista (sin rango y cortada en 'limit').
+    """
+    params = {"user_id": user_id, "limit": limit}
+    if since_id is not None:
+        params["since_id"] = int(since_id)
+    if desde:
+        params["desde"] = str(desde)
+    if hasta:
+        params["hasta"] = str(hasta)
+    if cursor:
+        params["cursor"] = cursor
+    data = _r("GET", "/fichajes", params=params)
+    # Backend antiguo: devuelve la lista sin paginar
+    if data is None or isinstance(data, list):
+        return {"items": data or [], "next_cursor": None, "paginado": False}
+    return {"items": data.get("items") or [], "next_cursor": data.get("next_cursor"), "paginado": True}
+
+def iter_fichajes(user_id: str, desde=None, hasta=None, page_size: int = 500, since_id: int | None = None):
+    """Recorre un rango página a página (generador de listas) siguiendo el cursor."""
+    cursor = None
+    while True:
+        page = get_fichajes_page(user_id, limit=page_size, desde=desde, hasta=hasta,
+                                 cursor=cursor, since_id=since_id)
+        if page["items"]:
+            yield page["items"]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
 
-def get_fichajes(user_id: str, limit: int = 200):
-    return _r("GET", "/fichajes", params={"user_id": user_id, "limit": limit})
+def get_fichajes(user_id: str, limit: int = 200, desde=None, hasta=None, cursor=None):
+    return get_fichajes_page(user_id, limit=limit, desde=desde, hasta=hasta, cursor=cursor)["items"]
 
 # ---- Vacaciones ----
 def post_vacaciones(user_id: str, usuario: str, fi, ff, dias: int, comentario=""):
@@ -0,0 +1,87 @@
+"""
+Benchmark del transporte HTTP de api_client contra un backend local simulado.
+
+Compara la llamada antigua (requests.request: conexión nueva por llamada)
+con la Session compartida (keep-alive + pool).
+
+    python benchmarks/bench_api_client.py [n_llamadas] [hilos]
+"""
+import json, os, sys, threading, time, statistics
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+BODY = json.dumps([
+    {"id": i, "empleado": "demo@logefrut.com", "fecha_local": "2025-01-01 08:00:00",
+     "tipo": "Entrada", "observaciones": "", "fuente": "movil"} for i in range(20)
+]).encode("utf-8")
+
+
+class _Stub(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # como uvicorn; evita esperas por ACK retrasado
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *a):
+        pass
+
+
+def _medir(fn, n, hilos):
+    lat = []
+    def una(_):
+        t0 = time.perf_counter()
+        fn()
+        lat.append(time.perf_counter() - t0)
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=hilos) as ex:
+        list(ex.map(una, range(n)))
+    total = time.perf_counter() - t0
+    lat.sort()
+    return {
+        "media_ms": statistics.mean(lat) * 1000,
+        "p95_ms": lat[int(len(lat) * 0.95) - 1] * 1000,
+        "llamadas_s": n / total,
+    }
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    hilos = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Stub)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{srv.server_address[1]}"
+    os.environ["BACKEND_BASE_URL"] = base
+
+    import api_client
+
+    def antes():
+        r = requests.request("GET", f"{base}/fichajes", timeout=30,
+                             params={"user_id": "u1", "limit": 200})
+        r.raise_for_status()
+        return r.json()
+
+    def despues():
+        return api_client.get_fichajes("u1", limit=200)
+
+    despues()  # calienta el pool
+    for nombre, fn in (("antes (requests.request)", antes), ("después (Session pool)", despues)):
+        res = _medir(fn, n, hilos)
+        print(f"{nombre:26s} media={res['media_ms']:.2f} ms  p95={res['p95_ms']:.2f} ms  "
+              f"{res['llamadas_s']:.0f} llamadas/s")
+    srv.shutdown()
+
+
+if __name__ == "__main__":
+    main()
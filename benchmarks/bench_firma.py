@@ -0,0 +1,83 @@
+"""
+Benchmark de estampado de firma: ráster (PNG) frente a vectorial (trazos del canvas).
+
+Genera documentos de muestra (1, 5 y 20 páginas con texto) y una firma sintética con
+el mismo formato que st_canvas (json_data de fabric.js + image_data RGBA 480x180).
+Mide tiempo de estampado y tamaño del PDF firmado; la última columna es lo que se
+subiría por firma con guardado incremental + delta (FIRMA_GUARDADO=delta).
+
+    python benchmarks/bench_firma.py [repeticiones]
+"""
+import math, os, sys, time, statistics
+
+import fitz
+import numpy as np
+from PIL import Image, ImageDraw
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import firma_pdf
+
+TEXTO = "Firmado por demo — 01/01/2025 09:00"
+
+
+def documento(paginas: int) -> bytes:
+    doc = fitz.open()
+    for i in range(paginas):
+        page = doc.new_page()
+        y = 72
+        while y < 770:
+            page.insert_text((72, y), f"Instrucción de trabajo — página {i + 1}, línea {y}", fontsize=10)
+            y += 14
+    data = doc.tobytes(garbage=3, deflate=True)
+    doc.close()
+    return data
+
+
+def firma_sintetica():
+    """Tres trazos tipo rúbrica en el lienzo de 480x180."""
+    objetos = []
+    img = Image.new("RGBA", (480, 180), (255, 255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    for k in range(3):
+        pts = [(40 + k * 140 + t * 1.2, 90 + 40 * math.sin(t / 9.0 + k)) for t in range(0, 100, 2)]
+        path = [["M", *pts[0]]]
+        for a, b in zip(pts[1:-1:2], pts[2::2]):
+            path.append(["Q", *a, *b])
+        path.append(["L", *pts[-1]])
+        objetos.append({"type": "path", "path": path, "strokeWidth": 2})
+        draw.line(pts, fill=(0, 0, 0, 255), width=2)
+    return {"objects": objetos}, np.asarray(img)
+
+
+def medir(fn, n):
+    tiempos = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        out = fn()
+        tiempos.append(time.perf_counter() - t0)
+    return statistics.median(tiempos) * 1000, len(out)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    json_data, imgdata = firma_sintetica()
+    trazos = firma_pdf.trazos_de_canvas(json_data)
+    print(f"{'documento':>12} {'original':>10} {'ráster ms':>10} {'ráster B':>10} "
+          f"{'vector ms':>10} {'vector B':>10} {'incr. ms':>10} {'delta B':>10}")
+    for paginas in (1, 5, 20):
+        pdf = documento(paginas)
+        with fitz.open(stream=pdf, filetype="pdf") as d:
+            r = d[-1].rect
+            rect = (r.x0, r.y0, r.x1, r.y1)
+        t_r, b_r = medir(lambda: firma_pdf.estampar_desde_canvas(pdf, imgdata, rect, TEXTO), n)
+        t_v, b_v = medir(lambda: firma_pdf.estampar_desde_canvas(pdf, None, rect, TEXTO, trazos), n)
+        t_i, b_i = medir(lambda: firma_pdf.estampar_desde_canvas(pdf, None, rect, TEXTO, trazos, True), n)
+        print(f"{paginas:>9} pág {len(pdf):>10} {t_r:>10.2f} {b_r:>10} {t_v:>10.2f} {b_v:>10} "
+              f"{t_i:>10.2f} {b_i - len(pdf):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Benchmark de la comprobación de geocerca: geopy.distance.geodesic (una sede, como hacía
+paginaFichajeMovil) frente a geocerca.Geocercas.comprobar con 1, 10, 100 y 1000 sedes.
+También mide el error de haversine frente a geodesic alrededor de la oficina.
+
+    python benchmarks/bench_geocerca.py [repeticiones]
+"""
+import os, random, sys, time
+
+from geopy.distance import geodesic
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import geocerca
+
+OFICINA = (41.51762, 2.19930)
+
+
+def puntos(n: int, radio_grados: float = 0.01) -> list[tuple]:
+    rnd = random.Random(1)
+    return [(OFICINA[0] + rnd.uniform(-radio_grados, radio_grados),
+             OFICINA[1] + rnd.uniform(-radio_grados, radio_grados)) for _ in range(n)]
+
+def sedes(n: int) -> list:
+    rnd = random.Random(2)
+    out = [geocerca.Sede("oficina", "Oficina", *OFICINA, 100)]
+    for i in range(n - 1):   # repartidas por Cataluña
+        out.append(geocerca.Sede(f"s{i}", f"Sede {i}", rnd.uniform(40.6, 42.8), rnd.uniform(0.2, 3.3), 150))
+    return out
+
+def medir(fn, pts) -> float:
+    t = time.perf_counter()
+    for p in pts:
+        fn(p)
+    return (time.perf_counter() - t) / len(pts) * 1e6
+
+
+def main():
+    rep = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    pts = puntos(rep)
+    base = medir(lambda p: geodesic(p, OFICINA).km <= 0.1, pts)
+    print(f"{'método':<28}{'µs/comprobación':>18}{'x':>8}")
+    print(f"{'geodesic (1 sede)':<28}{base:>18.1f}{1:>8.1f}")
+    for n in (1, 10, 100, 1000):
+        g = geocerca.Geocercas(sedes(n))
+        us = medir(lambda p: g.comprobar(*p), pts)
+        print(f"{f'geocerca ({n} sedes)':<28}{us:>18.1f}{base / us:>8.1f}")
+
+    err = max(abs(float(geocerca.haversine_m(*p, *OFICINA)) - geodesic(p, OFICINA).m) for p in puntos(1000, 0.002))
+    print(f"\nError máx. haversine vs geodesic a < 300 m: {err:.3f} m")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark del emparejado Entrada/Salida: el recorrido original de paginaModFechaMovil
+(_pair_and_sum, iterrows + strptime, un día cada vez) frente a jornada.resumen_por_dia
+sobre todo el rango de una vez. Comprueba además que ambos dan exactamente lo mismo.
+
+Datos sintéticos: un año laborable para N empleados, con pausas de comida, marcas
+olvidadas, salidas sin entrada y marcas repetidas a la misma hora.
+
+    python benchmarks/bench_jornada.py [empleados]
+"""
+import os, random, sys, time
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import jornada
+
+
+def _pair_and_sum(day_df: pd.DataFrame) -> tuple[list[str], float]:
+    """Implementación original (referencia)."""
+    marcas = []
+    total_seconds = 0
+    df = day_df.sort_values("fecha_local").reset_index(drop=True)
+    times = [(row["tipo"], datetime.strptime(row["fecha_local"], "%Y-%m-%d %H:%M:%S")) for _, row in df.iterrows()]
+    i = 0
+    while i < len(times):
+        tipo, t = times[i]
+        if tipo == "Entrada" and i + 1 < len(times) and times[i+1][0] == "Salida":
+            t2 = times[i+1][1]
+            marcas.append(f"{t.strftime('%H:%M')} - {t2.strftime('%H:%M')}")
+            total_seconds += (t2 - t).total_seconds()
+            i += 2
+        else:
+            marcas.append(f"{t.strftime('%H:%M')} - ?")
+            i += 1
+    total_horas = round(total_seconds / 3600.0, 2)
+    return marcas, total_horas
+
+
+def anio_sintetico(empleados: int, seed: int = 7) -> pd.DataFrame:
+    rnd = random.Random(seed)
+    filas = []
+    dia = date(2024, 1, 1)
+    dias = [dia + timedelta(days=i) for i in range(366) if (dia + timedelta(days=i)).weekday() < 5]
+    for e in range(empleados):
+        emp = f"empleado{e}@empresa.es"
+        for d in dias:
+            base = datetime.combine(d, datetime.min.time())
+            marcas = [("Entrada", 8 * 60 + rnd.randint(-20, 40)), ("Salida", 13 * 60 + rnd.randint(0, 30)),
+                      ("Entrada", 14 * 60 + rnd.randint(0, 30)), ("Salida", 17 * 60 + rnd.randint(-10, 60))]
+            r = rnd.random()
+            if r < 0.05:
+                marcas.pop(rnd.randrange(len(marcas)))           # marca olvidada
+            elif r < 0.07:
+                marcas.append(("Salida", 20 * 60))               # salida suelta
+            elif r < 0.09:
+                marcas.append((marcas[0][0], marcas[0][1]))      # repetida a la misma hora
+            for tipo, m in marcas:
+                t = base + timedelta(minutes=m, seconds=rnd.randint(0, 59))
+                filas.append({"empleado": emp, "fecha_local": t.strftime("%Y-%m-%d %H:%M:%S"), "tipo": tipo})
+    df = pd.DataFrame(filas)
+    return df.sample(frac=1, random_state=seed).reset_index(drop=True)   # orden de llegada cualquiera
+
+
+def original(df: pd.DataFrame) -> dict:
+    # Como la vista semanal: filtro por empleado y prefijo de día, y un _pair_and_sum por día
+    out = {}
+    for emp, g in df.groupby("empleado"):
+        for dia in sorted(g["fecha_local"].str[:10].unique()):
+            out[(emp, dia)] = _pair_and_sum(g[g["fecha_local"].str.startswith(dia)])
+    return out
+
+def vectorizado(df: pd.DataFrame) -> dict:
+    res = jornada.resumen_por_dia(df, por="empleado")
+    return {(e, d.isoformat()): (m, h) for e, d, m, h in res.itertuples(index=False)}
+
+
+def main():
+    empleados = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    df = anio_sintetico(empleados)
+    print(f"{empleados} empleados, {len(df)} fichajes")
+
+    t = time.perf_counter(); a = original(df); t_a = time.perf_counter() - t
+    t = time.perf_counter(); b = vectorizado(df); t_b = time.perf_counter() - t
+    print(f"original:    {t_a:8.2f} s")
+    print(f"vectorizado: {t_b:8.2f} s   ({t_a / t_b:.0f}x)")
+
+    distintos = [k for k in a if a[k] != b.get(k)]
+    print(f"días comparados: {len(a)}, distintos: {len(distintos)}, sobrantes: {len(set(b) - set(a))}")
+    for k in distintos[:5]:
+        print("  ", k, a[k], b.get(k))
+    sys.exit(1 if distintos or set(b) - set(a) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark de lectura de QR desde foto: pyzbar sobre la foto completa (como hacía
+paginaFichajeMovil) frente a qr_decode.leer (gris + reducción + ROI + reintentos).
+
+El corpus se genera al vuelo: fotos JPEG de 12 MP (4000x3000) con el QR de la oficina en
+distintas condiciones (centrado, lejos, girado, desenfocado, reflejo, poca luz, descentrado).
+Se pueden añadir fotos reales (.jpg/.png) de una carpeta; para esas solo se mide si se lee.
+
+    python benchmarks/bench_qr_decode.py [carpeta_fotos]
+
+Requiere qrcode, Pillow, pyzbar y la librería del sistema zbar.
+"""
+import io, os, random, statistics, sys, time
+
+import qrcode
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter
+from pyzbar.pyzbar import decode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import qr_decode
+
+TEXTO = "FICHAJE:mrQ-oK_7mCEZ"
+W, H = 4000, 3000
+
+
+def _fondo(rnd: random.Random) -> Image.Image:
+    img = Image.new("RGB", (W, H), (rnd.randint(120, 200),) * 3)
+    d = ImageDraw.Draw(img)
+    for _ in range(60):   # "escena": manchas y rectángulos
+        x, y = rnd.randint(0, W), rnd.randint(0, H)
+        c = tuple(rnd.randint(40, 230) for _ in range(3))
+        d.rectangle((x, y, x + rnd.randint(50, 900), y + rnd.randint(50, 700)), fill=c)
+    return img
+
+def foto(lado_qr: int, centro=(0.5, 0.5), giro=0, blur=0.0, reflejo=False, luz=1.0, seed=0) -> bytes:
+    rnd = random.Random(seed)
+    img = _fondo(rnd)
+    qr = qrcode.make(TEXTO, box_size=10, border=4).convert("RGB").resize((lado_qr, lado_qr), Image.NEAREST)
+    if giro:
+        qr = qr.rotate(giro, expand=True, fillcolor=(255, 255, 255))
+    x, y = int(W * centro[0] - qr.width / 2), int(H * centro[1] - qr.height / 2)
+    img.paste(qr, (x, y))
+    if reflejo:
+        capa = Image.new("L", (W, H), 0)
+        ImageDraw.Draw(capa).ellipse((x, y, x + lado_qr // 2, y + lado_qr // 3), fill=170)
+        img = Image.composite(Image.new("RGB", (W, H), (255, 255, 255)), img, capa.filter(ImageFilter.GaussianBlur(40)))
+    if blur:
+        img = img.filter(ImageFilter.GaussianBlur(blur))
+    if luz != 1.0:
+        img = ImageEnhance.Brightness(img).enhance(luz)
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+def corpus() -> list[tuple[str, bytes]]:
+    return [
+        ("centrado", foto(1400)),
+        ("lejos", foto(450, seed=1)),
+        ("girado 20º", foto(1200, giro=20, seed=2)),
+        ("desenfocado", foto(1400, blur=6, seed=3)),
+        ("reflejo", foto(1400, reflejo=True, seed=4)),
+        ("poca luz", foto(1400, luz=0.35, seed=5)),
+        ("descentrado", foto(1000, centro=(0.2, 0.25), seed=6)),
+    ]
+
+def completo(data) -> str | None:
+    res = decode(Image.open(io.BytesIO(data)))
+    return res[0].data.decode("utf-8", errors="ignore") if res else None
+
+def medir(fn, data, rep=3):
+    tiempos, texto = [], None
+    for _ in range(rep):
+        t = time.perf_counter()
+        texto = fn(data)
+        tiempos.append((time.perf_counter() - t) * 1000)
+    return statistics.median(tiempos), texto
+
+
+def main():
+    fotos = corpus()
+    if len(sys.argv) > 1:
+        carpeta = sys.argv[1]
+        for n in sorted(os.listdir(carpeta)):
+            if n.lower().endswith((".jpg", ".jpeg", ".png")):
+                with open(os.path.join(carpeta, n), "rb") as f:
+                    fotos.append((n, f.read()))
+
+    print(f"{'foto':<22}{'completa ms':>12}{'ok':>4}{'pipeline ms':>13}{'ok':>4}{'intentos':>10}  paso")
+    ok_a = ok_b = 0
+    ta, tb = [], []
+    for nombre, data in fotos:
+        ms_a, txt_a = medir(completo, data)
+        ms_b, lect = medir(lambda d: qr_decode.leer(io.BytesIO(d)), data)
+        a, b = txt_a is not None, lect.texto is not None
+        ok_a, ok_b = ok_a + a, ok_b + b
+        ta.append(ms_a); tb.append(ms_b)
+        print(f"{nombre:<22}{ms_a:>12.0f}{'✓' if a else '✗':>4}{ms_b:>13.0f}{'✓' if b else '✗':>4}"
+              f"{lect.intentos:>10}  {lect.intento or '-'}")
+    n = len(fotos)
+    print(f"\nMediana: completa {statistics.median(ta):.0f} ms, pipeline {statistics.median(tb):.0f} ms")
+    print(f"Aciertos: completa {ok_a}/{n}, pipeline {ok_b}/{n}")
+
+
+if __name__ == "__main__":
+    main()
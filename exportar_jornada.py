@@ -0,0 +1,186 @@
+# exportar_jornada.py
+# Exportación del registro de jornada (CSV, XLSX o PDF) para cualquier rango de fechas.
+#
+# Los fichajes se piden al backend página a página (sin caché) y se resumen por día al vuelo:
+# en memoria solo hay una página más el día que queda abierto en su borde. El fichero se
+# escribe en disco fila a fila (csv, openpyxl write_only, páginas de fitz) y la página lo sirve
+# como descarga. Supone que el backend devuelve el rango ordenado por fecha (asc o desc).
+import csv
+import hashlib
+import os
+import tempfile
+from datetime import date, datetime
+
+import fitz  # PyMuPDF
+import pandas as pd
+
+import jornada
+import tiempo
+from api_client import get_fichajes_page
+
+PAGINA = 500
+CABECERA = ["Empleado", "Fecha", "Primera entrada", "Última salida", "Tramos", "Horas", "Marcas sueltas"]
+FORMATOS = {
+    "CSV": ("csv", "text/csv"),
+    "XLSX": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "PDF": ("pdf", "application/pdf"),
+}
+
+
+class ExportacionIncompleta(RuntimeError):
+    pass
+
+
+def _paginas(user_id: str, desde: date, hasta: date):
+    """Páginas de fichajes del rango. Falla si el backend no pagina y la respuesta viene cortada."""
+    cursor = None
+    while True:
+        page = get_fichajes_page(user_id, limit=PAGINA, desde=desde, hasta=hasta, cursor=cursor)
+        if not page.get("paginado", True) and len(page["items"]) >= PAGINA:
+            # Backend antiguo: solo los PAGINA más recientes; un registro legal no puede ir incompleto
+            raise ExportacionIncompleta(
+                f"El backend no pagina y solo devuelve los {PAGINA} fichajes más recientes; "
+                "no se puede exportar el periodo completo.")
+        if page["items"]:
+            yield page["items"]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+
+def _resumir(filas: list[dict]) -> list[list]:
+    if not filas:
+        return []
+    res = jornada.jornada_por_dia(pd.DataFrame(filas), por="empleado")
+    return [[r.empleado, r.dia.isoformat(),
+             (r.primera_entrada or "")[:5] if isinstance(r.primera_entrada, str) else "",
+             (r.ultima_salida or "")[:5] if isinstance(r.ultima_salida, str) else "",
+             " · ".join(r.marcas), r.horas, int(r.sueltas)]
+            for r in res.itertuples(index=False)]
+
+def _dias_empleado(user_id: str, desde: date, hasta: date) -> list[list]:
+    """Filas por día de un empleado, en orden. Memoria: una página + el día abierto en su borde."""
+    abiertas: list[dict] = []
+    dias: list[list] = []
+    # El backend antiguo devuelve una lista sin paginar e ignora el rango: se filtra aquí
+    ini = desde.isoformat() if desde else ""
+    fin = hasta.isoformat() if hasta else "9999-12-31"
+    for page in _paginas(user_id, desde, hasta):
+        filas = abiertas + [f for f in ({
+            "empleado": r.get("empleado") or "",
+            "fecha_local": str(r.get("fecha_local") or "").replace("T", " ")[:19],
+            "tipo": r.get("tipo"),
+        } for r in page) if ini <= f["fecha_local"][:10] <= fin]
+        if not filas:
+            continue
+        # El último día de la página puede continuar en la siguiente: se deja abierto
+        borde = filas[-1]["fecha_local"][:10]
+        abiertas = [f for f in filas if f["fecha_local"][:10] == borde]
+        dias.extend(_resumir([f for f in filas if f["fecha_local"][:10] != borde]))
+    dias.extend(_resumir(abiertas))
+    return sorted(dias, key=lambda f: f[1])   # ya resumidas: una fila por día
+
+def filas(fuentes: list[str], desde: date, hasta: date):
+    """Genera las filas del informe (CABECERA) empleado a empleado; fuentes = user_ids."""
+    for user_id in fuentes:
+        yield from _dias_empleado(user_id, desde, hasta)
+
+
+# ---------- Escritores ----------
+def _csv(ruta: str, filas_it, **_):
+    with open(ruta, "w", newline="", encoding="utf-8-sig") as f:
+        w = csv.writer(f, delimiter=";")   # ';' para que Excel en español lo abra en columnas
+        w.writerow(CABECERA)
+        for fila in filas_it:
+            w.writerow([str(v).replace(".", ",") if isinstance(v, float) else v for v in fila])
+
+def _xlsx(ruta: str, filas_it, titulo: str = "", **_):
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Registro de jornada")
+    if titulo:
+        ws.append([titulo])
+    ws.append(CABECERA)
+    for fila in filas_it:
+        ws.append(fila)
+    wb.save(ruta)
+
+# PDF: A4 vertical, columnas en puntos
+_A4 = fitz.paper_rect("a4")
+_COLS = [36, 190, 250, 300, 350, 500, 540]
+_LINEA = 13
+_MARGEN_SUP, _MARGEN_INF = 90, 70
+
+def _pdf(ruta: str, filas_it, titulo: str = "", **_):
+    doc = fitz.open()
+    fuente = fitz.Font("helv")
+    huella = hashlib.sha256()
+    total = {"horas": 0.0, "dias": 0}
+    page, tw, y = None, None, 0
+
+    def nueva_pagina():
+        p = doc.new_page(width=_A4.width, height=_A4.height)
+        p.insert_text((36, 40), "Registro de jornada", fontsize=14)
+        p.insert_text((36, 56), titulo, fontsize=9)
+        for x, c in zip(_COLS, ["Empleado", "Fecha", "Entrada", "Salida", "Tramos", "Horas", "Suelt."]):
+            p.insert_text((x, _MARGEN_SUP - 10), c, fontsize=8)
+        p.draw_line((36, _MARGEN_SUP - 6), (_A4.width - 36, _MARGEN_SUP - 6), width=0.5)
+        return p, _MARGEN_SUP + 4
+
+    # Las filas van en un TextWriter por página (un solo bloque de texto): con insert_text por
+    # celda el PDF de un año ocupa ~20 veces más
+    for fila in filas_it:
+        if page is None or y > _A4.height - _MARGEN_INF:
+            if tw is not None:
+                tw.write_text(page)
+            page, y = nueva_pagina()
+            tw = fitz.TextWriter(page.rect)
+        huella.update(repr(fila).encode("utf-8"))
+        total["horas"] += fila[5]
+        total["dias"] += 1
+        emp, dia, ent, sal, marcas, horas, sueltas = fila
+        textos = [emp[:30], datetime.strptime(dia, "%Y-%m-%d").strftime("%d/%m/%Y"), ent, sal,
+                  marcas[:40], f"{horas:.2f}", str(sueltas or "")]
+        for x, t in zip(_COLS, textos):
+            tw.append((x, y), t, font=fuente, fontsize=7)
+        y += _LINEA
+    if tw is not None:
+        tw.write_text(page)
+
+    if page is None:
+        page, y = nueva_pagina()
+        page.insert_text((36, y), "Sin fichajes en el periodo.", fontsize=9)
+        y += _LINEA
+    if y > _A4.height - 160:
+        page, y = nueva_pagina()
+    y += 10
+    page.insert_text((36, y), f"Días con registro: {total['dias']}    Horas totales: {total['horas']:.2f}", fontsize=9)
+    y += 40
+    for x, etiqueta in ((36, "Firma de la empresa"), (320, "Firma del trabajador")):
+        page.draw_rect(fitz.Rect(x, y, x + 220, y + 50), width=0.5)
+        page.insert_text((x, y + 62), etiqueta, fontsize=8)
+    page.insert_text((36, _A4.height - 30),
+                     f"Generado {tiempo.ahora_local().strftime('%d/%m/%Y %H:%M')} · "
+                     f"Huella SHA-256 del registro: {huella.hexdigest()}", fontsize=6)
+    for i, p in enumerate(doc):
+        p.insert_text((_A4.width - 80, _A4.height - 30), f"Página {i + 1}/{doc.page_count}", fontsize=7)
+    doc.save(ruta, garbage=3, deflate=True)
+    doc.close()
+
+_ESCRITORES = {"CSV": _csv, "XLSX": _xlsx, "PDF": _pdf}
+
+
+def exportar(formato: str, fuentes: list[str], desde: date, hasta: date, titulo: str = "") -> str:
+    """
+    Escribe el registro de jornada de los user_ids 'fuentes' entre desde y hasta (inclusive)
+    en un fichero temporal y devuelve su ruta. formato: una clave de FORMATOS.
+    """
+    ext, _ = FORMATOS[formato]
+    fd, ruta = tempfile.mkstemp(prefix="registro_jornada_", suffix=f".{ext}")
+    os.close(fd)
+    try:
+        _ESCRITORES[formato](ruta, filas(fuentes, desde, hasta), titulo=titulo)
+    except Exception:
+        os.remove(ruta)
+        raise
+    return ruta
@@ -0,0 +1,230 @@
+# fichajes_outbox.py
+# Bandeja de salida (write-ahead) de fichajes en SQLite.
+# El botón solo escribe en local; un hilo de fondo por proceso envía al backend con reintentos.
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+import requests
+
+import api_cache
+import fichajes_store as store
+import tiempo
+from api_client import post_fichaje, post_fichajes_lote
+
+OUTBOX_TABLE = "fichajes_outbox"
+BATCH_MAX = 50
+BACKOFF_BASE_S = 2
+BACKOFF_MAX_S = 300
+PURGA_ENVIADOS_DIAS = 7
+
+
+class Rechazado(RuntimeError):
+    """Un item rechazado dentro de /fichajes/lote; status es el código HTTP del item si lo trae."""
+
+    def __init__(self, mensaje: str, status: int | None = None):
+        super().__init__(mensaje)
+        self.status = status
+
+
+def ensure_schema(db_file: str):
+    store.ensure_schema(db_file)
+    with store.get_conn(db_file) as conn:
+        cur = conn.cursor()
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {OUTBOX_TABLE} (
+                idem_key TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                empleado TEXT NOT NULL,
+                tipo TEXT NOT NULL CHECK (tipo IN ('Entrada','Salida')),
+                observaciones TEXT,
+                fuente TEXT,
+                fecha_local TEXT NOT NULL,   -- hora del toque 'YYYY-MM-DD HH:MM:SS'
+                fecha_utc   TEXT NOT NULL,
+                estado TEXT NOT NULL DEFAULT 'pendiente',  -- pendiente | enviado | error
+                intentos INTEGER NOT NULL DEFAULT 0,
+                proximo_intento REAL NOT NULL DEFAULT 0,   -- epoch
+                ultimo_error TEXT,
+                remote_id INTEGER,
+                enviado_utc TEXT
+            );
+        """)
+        cur.execute(f"CREATE INDEX IF NOT EXISTS idx_{OUTBOX_TABLE}_estado ON {OUTBOX_TABLE}(estado, proximo_intento);")
+        cur.execute(f"CREATE INDEX IF NOT EXISTS idx_{OUTBOX_TABLE}_user ON {OUTBOX_TABLE}(user_id, estado);")
+        conn.commit()
+
+def encolar(db_file: str, user_id: str, empleado: str, tipo: str, observaciones: str = "",
+            fuente: str = "movil") -> dict:
+    """Guarda el fichaje en la bandeja (commit local) y despierta al worker. No toca la red."""
+    ahora_utc = datetime.now(timezone.utc)
+    reg = {
+        "idem_key": str(uuid.uuid4()),
+        "user_id": user_id,
+        "empleado": empleado or "",
+        "tipo": tipo,
+        "observaciones": observaciones or "",
+        "fuente": fuente,
+        "fecha_local": ahora_utc.astimezone(tiempo.ZONA).strftime(tiempo.FORMATO),   # no la zona del servidor
+        "fecha_utc": ahora_utc.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    with store.get_conn(db_file) as conn:
+        conn.execute(f"""
+            INSERT INTO {OUTBOX_TABLE}(idem_key, user_id, empleado, tipo, observaciones, fuente, fecha_local, fecha_utc)
+            VALUES (:idem_key, :user_id, :empleado, :tipo, :observaciones, :fuente, :fecha_local, :fecha_utc);
+        """, reg)
+        conn.commit()
+    iniciar_worker(db_file).despertar()
+    return {**reg, "estado": "pendiente"}
+
+def listar(db_file: str, user_id: str, incluir_enviados: bool = False) -> list[dict]:
+    """Estado de la bandeja del usuario (lo más reciente primero)."""
+    sql = f"SELECT * FROM {OUTBOX_TABLE} WHERE user_id = ?"
+    if not incluir_enviados:
+        sql += " AND estado != 'enviado'"
+    sql += " ORDER BY fecha_utc DESC"
+    with store.get_conn(db_file) as conn:
+        conn.row_factory = lambda c, r: {d[0]: v for d, v in zip(c.description, r)}
+        return conn.execute(sql, (user_id,)).fetchall()
+
+
+# ===== Envío =====
+def _status_permanente(status: int) -> bool:
+    # 4xx (salvo timeout/limitación) no se arregla reintentando
+    return 400 <= status < 500 and status not in (408, 409, 425, 429)
+
+def _es_permanente(exc: Exception) -> bool:
+    if isinstance(exc, Rechazado):
+        # Sin código, el backend ha validado y rechazado el item: reintentar daría lo mismo
+        return exc.status is None or _status_permanente(exc.status)
+    resp = getattr(exc, "response", None)
+    if isinstance(exc, requests.HTTPError) and resp is not None:
+        return _status_permanente(resp.status_code)
+    return False
+
+def _payload(row: dict) -> dict:
+    return {
+        "idempotency_key": row["idem_key"], "user_id": row["user_id"], "empleado": row["empleado"],
+        "tipo": row["tipo"], "observaciones": row["observaciones"] or "", "fuente": row["fuente"],
+        "fecha_local": row["fecha_local"],
+    }
+
+def _enviar(rows: list[dict]) -> dict:
+    """Devuelve {idem_key: (ok, fichaje | excepción)}. Lote si hay varios; uno a uno si no."""
+    if len(rows) > 1:
+        try:
+            res = post_fichajes_lote([_payload(r) for r in rows]) or {}
+            out = {}
+            for it in res.get("results") or []:
+                if it.get("ok"):
+                    out[it["idempotency_key"]] = (True, it.get("fichaje") or {})
+                else:
+                    status = it.get("status") or it.get("code")
+                    out[it["idempotency_key"]] = (False, Rechazado(
+                        it.get("error") or "rechazado", int(status) if str(status or "").isdigit() else None))
+            return out
+        except requests.RequestException as e:
+            # Backend sin /fichajes/lote: seguimos con envíos individuales. Cualquier otro fallo
+            # (HTTP, conexión, timeout) cuenta como intento fallido de todas las filas del lote
+            if not isinstance(e, requests.HTTPError) or getattr(e.response, "status_code", None) not in (404, 405):
+                return {r["idem_key"]: (False, e) for r in rows}
+    out = {}
+    for r in rows:
+        try:
+            p = _payload(r)
+            out[r["idem_key"]] = (True, post_fichaje(
+                user_id=p["user_id"], empleado=p["empleado"], tipo=p["tipo"],
+                observ=p["observaciones"], fuente=p["fuente"],
+                idempotency_key=p["idempotency_key"], fecha_local=p["fecha_local"],
+            ) or {})
+        except Exception as e:
+            out[r["idem_key"]] = (False, e)
+    return out
+
+def vaciar(db_file: str, max_lote: int = BATCH_MAX) -> int:
+    """Un pase de envío de lo pendiente y vencido. Devuelve cuántos se confirmaron."""
+    ahora = time.time()
+    with store.get_conn(db_file) as conn:
+        conn.row_factory = lambda c, r: {d[0]: v for d, v in zip(c.description, r)}
+        rows = conn.execute(
+            f"SELECT * FROM {OUTBOX_TABLE} WHERE estado = 'pendiente' AND proximo_intento <= ? "
+            f"ORDER BY fecha_utc LIMIT ?;", (ahora, max_lote)
+        ).fetchall()
+    if not rows:
+        return 0
+
+    resultados = _enviar(rows)
+    ok = 0
+    with store.get_conn(db_file) as conn:
+        for r in rows:
+            exito, valor = resultados.get(r["idem_key"], (False, RuntimeError("sin respuesta del lote")))
+            if exito:
+                ok += 1
+                remote_id = valor.get("id") if isinstance(valor, dict) else None
+                conn.execute(
+                    f"UPDATE {OUTBOX_TABLE} SET estado = 'enviado', remote_id = ?, ultimo_error = NULL, "
+                    f"enviado_utc = datetime('now') WHERE idem_key = ?;", (remote_id, r["idem_key"])
+                )
+            else:
+                intentos = r["intentos"] + 1
+                espera = min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** (intentos - 1))
+                conn.execute(
+                    f"UPDATE {OUTBOX_TABLE} SET estado = ?, intentos = ?, proximo_intento = ?, ultimo_error = ? "
+                    f"WHERE idem_key = ?;",
+                    ("error" if _es_permanente(valor) else "pendiente", intentos,
+                     time.time() + espera, str(valor)[:500], r["idem_key"])
+                )
+        conn.execute(
+            f"DELETE FROM {OUTBOX_TABLE} WHERE estado = 'enviado' AND enviado_utc < datetime('now', ?);",
+            (f"-{PURGA_ENVIADOS_DIAS} days",)
+        )
+        conn.commit()
+
+    # Lo confirmado pasa al espejo local para que el historial lo muestre sin esperar al sync
+    por_usuario = {}
+    for r in rows:
+        exito, valor = resultados.get(r["idem_key"], (False, None))
+        if exito and isinstance(valor, dict) and valor.get("id") is not None:
+            por_usuario.setdefault(r["user_id"], []).append({**_payload(r), **valor})
+    for user_id, regs in por_usuario.items():
+        store.guardar_remotos(db_file, user_id, regs, avanzar_marca=False)
+    for user_id in {r["user_id"] for r in rows if resultados.get(r["idem_key"], (False,))[0]}:
+        api_cache.invalidar(user_id, "fichajes")
+    return ok
+
+
+class _Worker(threading.Thread):
+    def __init__(self, db_file: str, intervalo_s: float = 5.0):
+        super().__init__(name=f"outbox-{db_file}", daemon=True)
+        self.db_file = db_file
+        self.intervalo_s = intervalo_s
+        self._evento = threading.Event()
+
+    def despertar(self):
+        self._evento.set()
+
+    def run(self):
+        while True:
+            self._evento.wait(self.intervalo_s)
+            self._evento.clear()
+            try:
+                # Mientras salgan lotes llenos seguimos vaciando sin esperar
+                while vaciar(self.db_file) >= BATCH_MAX:
+                    pass
+            except Exception:
+                time.sleep(self.intervalo_s)  # SQLite bloqueada, etc.: siguiente vuelta
+
+
+_workers: dict[str, _Worker] = {}
+_workers_lock = threading.Lock()
+
+def iniciar_worker(db_file: str) -> _Worker:
+    """Un único worker por fichero y proceso (compartido por todas las sesiones de Streamlit)."""
+    with _workers_lock:
+        w = _workers.get(db_file)
+        if w is None or not w.is_alive():
+            ensure_schema(db_file)
+            w = _Worker(db_file)
+            _workers[db_file] = w
+            w.start()
+        return w
@@ -0,0 +1,241 @@
+# fichajes_store.py
+# Espejo local (SQLite) de los fichajes del backend.
+# Las páginas leen de aquí; el backend solo se consulta para traer el delta (since_id).
+#
+# jornada_dia guarda por empleado y día los segundos trabajados, primera entrada, última salida
+# y marcas sueltas. Se actualiza al guardar fichajes recalculando solo los días tocados, así
+# los totales de semana/mes/año se leen de ahí sin volver a emparejar marcas.
+#
+# Las migraciones de datos se hacen una sola vez y se anotan en PRAGMA user_version.
+import os
+import sqlite3
+from datetime import date, timedelta
+
+import pandas as pd
+
+import jornada
+import tiempo
+from api_cache import iter_fichajes
+
+TABLE = "fichajes"
+SYNC_TABLE = "fichajes_sync"
+ROLLUP_TABLE = "jornada_dia"
+VERSION = 1   # 1: epoch desde fecha_utc y jornada_dia con segundos por epoch
+
+# epoch: segundos UTC de fecha_utc, calculado al guardar para no volver a parsear textos
+COLUMNAS = ["id", "empleado", "fecha_local", "fecha_utc", "tipo", "observaciones", "fuente", "epoch"]
+
+
+def get_conn(db_file: str):
+    os.makedirs(os.path.dirname(db_file), exist_ok=True)
+    return sqlite3.connect(db_file, timeout=30)
+
+def ensure_schema(db_file: str):
+    """Crea la tabla fichajes (mismo esquema que las páginas) y migra las columnas del espejo."""
+    with get_conn(db_file) as conn:
+        cur = conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL;")  # lectores no bloquean al sincronizador
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {TABLE} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                empleado TEXT NOT NULL,
+                fecha_local TEXT NOT NULL,   -- 'YYYY-MM-DD HH:MM:SS'
+                fecha_utc   TEXT NOT NULL,   -- 'YYYY-MM-DD HH:MM:SS' (UTC)
+                tipo TEXT NOT NULL CHECK (tipo IN ('Entrada','Salida')),
+                observaciones TEXT,
+                fuente TEXT DEFAULT 'movil',
+                created_at_utc TEXT DEFAULT (datetime('now'))
+            );
+        """)
+        existentes = {r[1] for r in cur.execute(f"PRAGMA table_info({TABLE});")}
+        if "user_id" not in existentes:
+            cur.execute(f"ALTER TABLE {TABLE} ADD COLUMN user_id TEXT;")
+        if "remote_id" not in existentes:
+            cur.execute(f"ALTER TABLE {TABLE} ADD COLUMN remote_id INTEGER;")  # id del backend
+        if "epoch" not in existentes:
+            cur.execute(f"ALTER TABLE {TABLE} ADD COLUMN epoch INTEGER;")
+        cur.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS ux_{TABLE}_remote_id ON {TABLE}(remote_id);")
+        cur.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE}_empleado_fecha ON {TABLE}(empleado, fecha_local);")
+        cur.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE}_user_fecha ON {TABLE}(user_id, fecha_local);")
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {SYNC_TABLE} (
+                user_id TEXT PRIMARY KEY,
+                last_remote_id INTEGER NOT NULL DEFAULT 0,
+                synced_at_utc TEXT
+            );
+        """)
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {ROLLUP_TABLE} (
+                empleado TEXT NOT NULL,
+                dia TEXT NOT NULL,                 -- 'YYYY-MM-DD'
+                segundos INTEGER NOT NULL,         -- trabajados (solo tramos Entrada-Salida)
+                tramos INTEGER NOT NULL,
+                sueltas INTEGER NOT NULL,          -- marcas sin pareja (anomalía)
+                primera_entrada TEXT,              -- 'HH:MM:SS'
+                ultima_salida TEXT,
+                PRIMARY KEY (empleado, dia)
+            ) WITHOUT ROWID;
+        """)
+        conn.commit()
+        if cur.execute("PRAGMA user_version;").fetchone()[0] < VERSION:
+            _migrar(conn)
+
+def _migrar(conn):
+    """Una sola vez por base: epoch de todas las filas desde fecha_utc y jornada_dia desde cero."""
+    conn.execute("BEGIN IMMEDIATE;")   # otro proceso puede estar migrando a la vez
+    if conn.execute("PRAGMA user_version;").fetchone()[0] >= VERSION:
+        conn.rollback()
+        return
+    filas = pd.read_sql_query(f"SELECT id, fecha_local, fecha_utc FROM {TABLE}", conn)
+    if not filas.empty:
+        epochs = tiempo.fichaje_a_epoch(filas["fecha_utc"], filas["fecha_local"])
+        conn.executemany(f"UPDATE {TABLE} SET epoch = ? WHERE id = ?;",
+                         zip(epochs.tolist(), filas["id"].tolist()))
+    conn.execute(f"DELETE FROM {ROLLUP_TABLE};")
+    _recalcular(conn, None)
+    conn.execute(f"PRAGMA user_version = {VERSION};")
+    conn.commit()
+
+def _recalcular(conn, dias: set[tuple[str, str]] | None):
+    """Recalcula jornada_dia para los (empleado, 'YYYY-MM-DD') dados, o para todo si es None."""
+    sql = f"SELECT empleado, fecha_local, tipo, epoch FROM {TABLE}"
+    if dias is None:
+        df = pd.read_sql_query(sql, conn)
+    else:
+        if not dias:
+            return
+        partes = [pd.read_sql_query(sql + " WHERE empleado = ? AND fecha_local >= ? AND fecha_local < ?", conn,
+                                    params=(emp, dia, (date.fromisoformat(dia) + timedelta(days=1)).isoformat()))
+                  for emp, dia in dias]
+        df = pd.concat(partes, ignore_index=True)
+        # Días que se quedan sin fichajes
+        conn.executemany(f"DELETE FROM {ROLLUP_TABLE} WHERE empleado = ? AND dia = ?;", list(dias))
+    if df.empty:
+        return
+
+    res = jornada.jornada_por_dia(df, por="empleado")
+    conn.executemany(f"""
+        INSERT INTO {ROLLUP_TABLE}(empleado, dia, segundos, tramos, sueltas, primera_entrada, ultima_salida)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(empleado, dia) DO UPDATE SET
+            segundos = excluded.segundos, tramos = excluded.tramos, sueltas = excluded.sueltas,
+            primera_entrada = excluded.primera_entrada, ultima_salida = excluded.ultima_salida;
+    """, [(r.empleado, r.dia.isoformat(), int(r.segundos), int(r.tramos), int(r.sueltas),
+           None if pd.isna(r.primera_entrada) else r.primera_entrada,
+           None if pd.isna(r.ultima_salida) else r.ultima_salida) for r in res.itertuples(index=False)])
+
+def _norm_fecha(valor) -> str:
+    # El backend puede mandar ISO con 'T' y microsegundos; guardamos 'YYYY-MM-DD HH:MM:SS'
+    return str(valor or "").replace("T", " ")[:19]
+
+def _fila(user_id: str, r: dict) -> tuple:
+    return (
+        int(r["id"]), user_id, r.get("empleado") or "",
+        _norm_fecha(r.get("fecha_local")), _norm_fecha(r.get("fecha_utc")),
+        r.get("tipo"), r.get("observaciones") or "", r.get("fuente") or "movil",
+    )
+
+def guardar_remotos(db_file: str, user_id: str, registros: list[dict], avanzar_marca: bool = True) -> int:
+    """
+    Upsert por remote_id de fichajes que vienen del backend. Devuelve cuántos había nuevos.
+    avanzar_marca=False para altas sueltas (outbox): no deben saltarse ids aún no sincronizados.
+    """
+    filas = [_fila(user_id, r) for r in registros if r.get("id") is not None]
+    if not filas:
+        return 0
+    # Epoch de toda la página de una vez
+    epochs = tiempo.fichaje_a_epoch(pd.Series([f[4] for f in filas]), pd.Series([f[3] for f in filas])).tolist()
+    filas = [f + (e,) for f, e in zip(filas, epochs)]
+    with get_conn(db_file) as conn:
+        cur = conn.cursor()
+        antes = conn.total_changes
+        cur.executemany(f"""
+            INSERT INTO {TABLE}(remote_id, user_id, empleado, fecha_local, fecha_utc, tipo, observaciones, fuente, epoch)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(remote_id) DO NOTHING;
+        """, filas)
+        nuevos = conn.total_changes - antes
+        if nuevos:
+            _recalcular(conn, {(f[2], f[3][:10]) for f in filas})
+        if avanzar_marca:
+            cur.execute(f"""
+                INSERT INTO {SYNC_TABLE}(user_id, last_remote_id, synced_at_utc)
+                VALUES (?, ?, datetime('now'))
+                ON CONFLICT(user_id) DO UPDATE SET
+                    last_remote_id = MAX(last_remote_id, excluded.last_remote_id),
+                    synced_at_utc = excluded.synced_at_utc;
+            """, (user_id, max(f[0] for f in filas)))
+        conn.commit()
+    return nuevos
+
+def ultimo_remote_id(db_file: str, user_id: str) -> int:
+    with get_conn(db_file) as conn:
+        row = conn.execute(f"SELECT last_remote_id FROM {SYNC_TABLE} WHERE user_id = ?;", (user_id,)).fetchone()
+    return int(row[0]) if row else 0
+
+def sincronizar(db_file: str, user_id: str) -> int:
+    """
+    Trae del backend solo los fichajes con id > último sincronizado y los guarda en local.
+    Lanza la excepción del backend si falla; lo ya guardado sigue disponible para leer.
+    """
+    since = ultimo_remote_id(db_file, user_id)
+    nuevos = 0
+    for page in iter_fichajes(user_id, since_id=since):
+        nuevos += guardar_remotos(db_file, user_id, page)
+    return nuevos
+
+def leer_fichajes(db_file: str, *, empleado: str | None = None, user_id: str | None = None,
+                  desde: date | None = None, hasta: date | None = None,
+                  limit: int | None = None, descendente: bool = True) -> pd.DataFrame:
+    """Lee fichajes locales por empleado (o user_id) y rango de días inclusivo, usando el índice."""
+    where, params = [], []
+    if empleado:
+        where.append("empleado = ?"); params.append(empleado)
+    elif user_id:
+        where.append("user_id = ?"); params.append(user_id)
+    if desde:
+        where.append("fecha_local >= ?"); params.append(desde.strftime("%Y-%m-%d"))
+    if hasta:
+        # rango semiabierto: hasta el inicio del día siguiente
+        where.append("fecha_local < ?"); params.append((hasta + timedelta(days=1)).strftime("%Y-%m-%d"))
+    sql = f"SELECT {', '.join(COLUMNAS)} FROM {TABLE}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY fecha_local {'DESC' if descendente else 'ASC'}, id"
+    if limit:
+        sql += " LIMIT ?"; params.append(int(limit))
+    with get_conn(db_file) as conn:
+        return pd.read_sql_query(sql, conn, params=params)
+
+def jornada_dias(db_file: str, empleado: str, desde: date, hasta: date) -> pd.DataFrame:
+    """Filas de jornada_dia del empleado en el rango de días inclusivo."""
+    with get_conn(db_file) as conn:
+        return pd.read_sql_query(
+            f"SELECT * FROM {ROLLUP_TABLE} WHERE empleado = ? AND dia BETWEEN ? AND ? ORDER BY dia",
+            conn, params=(empleado, desde.isoformat(), hasta.isoformat()),
+        )
+
+def totales(db_file: str, empleado: str, desde: date, hasta: date, periodo: str = "mes") -> pd.DataFrame:
+    """
+    Totales por 'semana' (ISO, 'YYYY-Www'), 'mes' ('YYYY-MM') o 'anio' ('YYYY') desde jornada_dia:
+    periodo, dias (con fichajes), horas, anomalias (días con marcas sueltas).
+    """
+    if periodo == "semana":
+        df = jornada_dias(db_file, empleado, desde, hasta)
+        iso = pd.to_datetime(df["dia"]).dt.isocalendar()
+        df["periodo"] = iso["year"].astype(str) + "-W" + iso["week"].astype(str).str.zfill(2)
+        g = df.groupby("periodo", sort=True)
+        res = pd.DataFrame({"dias": g.size(), "segundos": g["segundos"].sum(),
+                            "anomalias": g["sueltas"].apply(lambda s: int((s > 0).sum()))}).reset_index()
+    else:
+        n = {"mes": 7, "anio": 4}[periodo]
+        with get_conn(db_file) as conn:
+            res = pd.read_sql_query(f"""
+                SELECT substr(dia, 1, {n}) AS periodo, COUNT(*) AS dias, SUM(segundos) AS segundos,
+                       SUM(sueltas > 0) AS anomalias
+                FROM {ROLLUP_TABLE}
+                WHERE empleado = ? AND dia BETWEEN ? AND ?
+                GROUP BY periodo ORDER BY periodo
+            """, conn, params=(empleado, desde.isoformat(), hasta.isoformat()))
+    res["horas"] = (res["segundos"] / 3600.0).round(2)
+    return res[["periodo", "dias", "horas", "anomalias"]]
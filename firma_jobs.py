@@ -0,0 +1,130 @@
+# firma_jobs.py
+# Cola de trabajos de firma: estampado en un pool de procesos (CPU, fuera del GIL de Streamlit)
+# y subida/registro en un pool de hilos (red). La página solo encola y consulta el estado.
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import firma_pdf
+import firma_store
+import pdf_cache
+
+HILOS = int(os.getenv("FIRMA_HILOS") or 4)
+# Los procesos se arrancan con "spawn": hacer fork de un servidor con hilos puede heredar locks tomados
+PROCESOS = int(os.getenv("FIRMA_PROCESOS") or 2)     # 0 = estampar en el propio hilo
+INCREMENTAL = (os.getenv("FIRMA_INCREMENTAL") or "1") == "1"   # guardar solo lo añadido al original
+COLA_MAX = int(os.getenv("FIRMA_COLA_MAX") or 64)
+RETENER_S = 3600     # tiempo que se guardan los trabajos terminados para consultar su estado
+
+EN_COLA, PROCESANDO, OK, ERROR = "en cola", "procesando", "ok", "error"
+
+
+class ColaLlena(RuntimeError):
+    pass
+
+
+@dataclass
+class Trabajo:
+    id: str
+    user_id: str
+    doc_id: str
+    estado: str = EN_COLA
+    error: str | None = None
+    path: str | None = None
+    creado: float = field(default_factory=time.monotonic)
+    inicio: float | None = None
+    fin: float | None = None
+
+
+_lock = threading.Lock()
+_trabajos: dict[str, Trabajo] = {}
+_activos: dict[tuple, str] = {}                 # (user_id, doc_id) -> id del trabajo en curso
+_latencias: deque = deque(maxlen=500)           # segundos de extremo a extremo
+_contadores = {"encolados": 0, "ok": 0, "error": 0, "rechazados": 0}
+_hilos = None
+_procesos = None
+
+
+def _pools():
+    global _hilos, _procesos
+    with _lock:
+        if _hilos is None:
+            _hilos = ThreadPoolExecutor(max_workers=HILOS, thread_name_prefix="firma")
+            if PROCESOS > 0:
+                _procesos = ProcessPoolExecutor(max_workers=PROCESOS,
+                                                mp_context=multiprocessing.get_context("spawn"))
+    return _hilos, _procesos
+
+def _purgar():
+    # Llamar con _lock
+    limite = time.monotonic() - RETENER_S
+    for jid in [j for j, t in _trabajos.items() if t.fin and t.fin < limite]:
+        del _trabajos[jid]
+
+def _ejecutar(trabajo: Trabajo, sb, doc: dict, imgdata, texto: str, json_data=None):
+    trabajo.estado, trabajo.inicio = PROCESANDO, time.monotonic()
+    try:
+        original = pdf_cache.obtener(doc["url"])
+        trazos = firma_pdf.trazos_de_canvas(json_data) if firma_pdf.FIRMA_MODO == "vector" else []
+        # Se pasa la ruta del original cacheado (no sus bytes); con trazos tampoco hace falta el RGBA
+        args = (original.ruta, None if trazos else imgdata, original.last_rect, texto, trazos, INCREMENTAL)
+        _, procesos = _pools()
+        if procesos is not None:
+            signed_pdf = procesos.submit(firma_pdf.estampar_desde_canvas, *args).result()
+        else:
+            signed_pdf = firma_pdf.estampar_desde_canvas(*args)
+        trabajo.path = firma_store.persistir_firma(sb, trabajo.user_id, doc, signed_pdf, original=original)
+        trabajo.estado = OK
+    except Exception as e:
+        trabajo.estado, trabajo.error = ERROR, str(e)
+    finally:
+        trabajo.fin = time.monotonic()
+        with _lock:
+            _activos.pop((trabajo.user_id, trabajo.doc_id), None)
+            _contadores["ok" if trabajo.estado == OK else "error"] += 1
+            _latencias.append(trabajo.fin - trabajo.creado)
+
+def encolar(sb, user_id: str, user_name: str, doc: dict, imgdata, json_data=None) -> str:
+    """
+    Encola la firma de 'doc' y devuelve el id del trabajo. Si ya hay uno en curso para
+    ese usuario y documento devuelve ese. Lanza ColaLlena si se supera FIRMA_COLA_MAX.
+    """
+    hilos, _ = _pools()
+    with _lock:
+        _purgar()
+        jid = _activos.get((user_id, doc["id"]))
+        if jid:
+            return jid
+        if len(_activos) >= COLA_MAX:
+            _contadores["rechazados"] += 1
+            raise ColaLlena("Hay demasiadas firmas en curso. Inténtalo en unos segundos.")
+        trabajo = Trabajo(id=uuid.uuid4().hex, user_id=user_id, doc_id=doc["id"])
+        _trabajos[trabajo.id] = trabajo
+        _activos[(user_id, doc["id"])] = trabajo.id
+        _contadores["encolados"] += 1
+    texto = f"Firmado por {user_name} — {datetime.now().strftime('%d/%m/%Y %H:%M')}"
+    hilos.submit(_ejecutar, trabajo, sb, doc, imgdata, texto, json_data)
+    return trabajo.id
+
+def estado(job_id: str) -> Trabajo | None:
+    with _lock:
+        return _trabajos.get(job_id)
+
+def metricas() -> dict:
+    """Profundidad de cola, en curso, contadores y latencia (media/p95) de los últimos trabajos."""
+    with _lock:
+        lat = sorted(_latencias)
+        estados = [t.estado for t in _trabajos.values()]
+        return {
+            "en_cola": estados.count(EN_COLA),
+            "procesando": estados.count(PROCESANDO),
+            **_contadores,
+            "latencia_media_s": round(sum(lat) / len(lat), 3) if lat else None,
+            "latencia_p95_s": round(lat[max(0, int(len(lat) * 0.95) - 1)], 3) if lat else None,
+        }
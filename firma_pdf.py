@@ -0,0 +1,160 @@
+# firma_pdf.py
+# Estampado de la firma en el PDF. Funciones puras (bytes -> bytes) para poder ejecutarlas
+# en un proceso aparte desde firma_jobs.
+#
+# Dos modos: vectorial (trazos del canvas -> caminos PDF, sin codificar imágenes) y
+# ráster (PNG recortado), que queda como alternativa si no hay trazos.
+#
+# Con incremental=True el original no se reescribe: se copia el fichero cacheado, se estampa
+# y se guarda como actualización incremental (original + objetos nuevos al final).
+import io
+import os
+import shutil
+import tempfile
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+FIRMA_ANCHO = 180   # pt
+FIRMA_ALTO_MAX = 72 # pt (trazos muy verticales)
+MARGEN = 36         # pt
+FIRMA_MODO = os.getenv("FIRMA_MODO") or "vector"   # vector | raster
+
+
+def firma_a_png(imgdata) -> bytes:
+    """Convierte el RGBA del canvas a PNG recortado al trazo."""
+    img = Image.fromarray(imgdata.astype("uint8")).convert("RGBA")
+    bbox = img.getbbox()
+    if bbox:
+        img = img.crop(bbox)
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+def _abrir(original, incremental: bool):
+    """original: bytes o ruta en disco. Devuelve (doc, ruta temporal | None)."""
+    if not incremental:
+        if isinstance(original, (bytes, bytearray)):
+            return fitz.open(stream=original, filetype="pdf"), None
+        return fitz.open(original), None
+    fd, tmp = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    if isinstance(original, (bytes, bytearray)):
+        with open(tmp, "wb") as f:
+            f.write(original)
+    else:
+        shutil.copyfile(original, tmp)
+    return fitz.open(tmp), tmp
+
+def _guardar(pdf_in, tmp: str | None) -> bytes:
+    try:
+        if tmp and pdf_in.can_save_incrementally():
+            pdf_in.saveIncr()
+            pdf_in.close()
+            with open(tmp, "rb") as f:
+                return f.read()
+        # PDF reparado al abrir, etc.: no admite incremental, se reescribe entero
+        out = io.BytesIO()
+        pdf_in.save(out)
+        pdf_in.close()
+        return out.getvalue()
+    finally:
+        if tmp:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+def estampar(pdf_bytes, sig_png: bytes, last_rect: tuple, texto: str, incremental: bool = False) -> bytes:
+    """Firma abajo a la derecha y texto abajo a la izquierda de la última página."""
+    pdf_in, tmp = _abrir(pdf_bytes, incremental)
+    page = pdf_in[-1]
+    rect = fitz.Rect(last_rect)
+
+    pix = fitz.Pixmap(sig_png)
+    target_w = FIRMA_ANCHO
+    scale = target_w / pix.width
+    new_w = target_w
+    new_h = int(pix.height * scale)
+
+    x = rect.x1 - new_w - MARGEN
+    y = rect.y1 - new_h - MARGEN
+    page.insert_image(fitz.Rect(x, y, x + new_w, y + new_h), stream=sig_png)
+
+    page.insert_text((MARGEN, rect.y1 - MARGEN), texto, fontsize=10, color=(0, 0, 0))
+
+    return _guardar(pdf_in, tmp)
+
+def trazos_de_canvas(json_data) -> list[list[tuple]]:
+    """
+    Extrae los trazos de st_canvas (fabric.js, modo freedraw) como listas de segmentos
+    ('M', p) / ('L', p) / ('Q', c, p) en coordenadas del canvas. En freedraw los objetos no
+    se transforman, así que las coordenadas del 'path' ya son las del lienzo.
+    """
+    trazos = []
+    for obj in (json_data or {}).get("objects") or []:
+        if obj.get("type") != "path":
+            continue
+        segs = []
+        for cmd in obj.get("path") or []:
+            op, nums = cmd[0], [float(v) for v in cmd[1:]]
+            if op in ("M", "L") and len(nums) >= 2:
+                segs.append((op, (nums[0], nums[1])))
+            elif op == "Q" and len(nums) >= 4:
+                segs.append((op, (nums[0], nums[1]), (nums[2], nums[3])))
+        if segs:
+            trazos.append(segs)
+    return trazos
+
+def estampar_vectorial(pdf_bytes, trazos: list, last_rect: tuple, texto: str,
+                       grosor: float = 2.0, incremental: bool = False) -> bytes:
+    """Dibuja los trazos como caminos PDF (beziers) en la misma caja que la firma ráster."""
+    pts = [p for t in trazos for s in t for p in s[1:]]
+    x0, y0 = min(p[0] for p in pts), min(p[1] for p in pts)
+    x1, y1 = max(p[0] for p in pts), max(p[1] for p in pts)
+    ancho, alto = max(x1 - x0, 1.0), max(y1 - y0, 1.0)
+    escala = min(FIRMA_ANCHO / ancho, FIRMA_ALTO_MAX / alto)
+
+    pdf_in, tmp = _abrir(pdf_bytes, incremental)
+    page = pdf_in[-1]
+    rect = fitz.Rect(last_rect)
+    ox = rect.x1 - ancho * escala - MARGEN
+    oy = rect.y1 - alto * escala - MARGEN
+
+    def P(p):
+        return fitz.Point(ox + (p[0] - x0) * escala, oy + (p[1] - y0) * escala)
+
+    shape = page.new_shape()
+    for t in trazos:
+        actual = None
+        for s in t:
+            if s[0] == "M":
+                actual = P(s[1])
+            elif s[0] == "L" and actual is not None:
+                fin = P(s[1])
+                shape.draw_line(actual, fin)
+                actual = fin
+            elif s[0] == "Q" and actual is not None:
+                c, fin = P(s[1]), P(s[2])
+                # cuadrática -> cúbica equivalente
+                c1 = actual + (c - actual) * (2 / 3)
+                c2 = fin + (c - fin) * (2 / 3)
+                shape.draw_bezier(actual, c1, c2, fin)
+                actual = fin
+        # un punto suelto (toque) se dibuja como un trazo mínimo
+        if len(t) == 1 and actual is not None:
+            shape.draw_line(actual, actual + (0.01, 0))
+    shape.finish(color=(0, 0, 0), width=max(grosor * escala, 0.5), lineCap=1, lineJoin=1, closePath=False)
+    shape.commit()
+
+    page.insert_text((MARGEN, rect.y1 - MARGEN), texto, fontsize=10, color=(0, 0, 0))
+
+    return _guardar(pdf_in, tmp)
+
+def estampar_desde_canvas(pdf_bytes, imgdata, last_rect: tuple, texto: str,
+                          trazos: list | None = None, incremental: bool = False) -> bytes:
+    # Punto de entrada del pool de procesos: estampado fuera del hilo de Streamlit.
+    # pdf_bytes puede ser la ruta del original en pdf_cache (evita pasar el PDF entre procesos)
+    if trazos and FIRMA_MODO == "vector":
+        return estampar_vectorial(pdf_bytes, trazos, last_rect, texto, incremental=incremental)
+    return estampar(pdf_bytes, firma_a_png(imgdata), last_rect, texto, incremental=incremental)
@@ -0,0 +1,131 @@
+# firma_store.py
+# Persistencia idempotente de una firma: objeto en Storage + fila en doc_signatures como una unidad.
+#
+# Clave: (user_id, doc_id, sha256 del PDF firmado). La ruta del objeto se deriva de la clave,
+# así que reintentar sube al mismo sitio (upsert) y la fila se deduplica en el servidor con
+# upsert sobre (user_id, doc_id). Requiere en Supabase:
+#   alter table doc_signatures add column if not exists content_sha256 text;
+#   alter table doc_signatures add column if not exists original_url text;
+#   create unique index if not exists doc_signatures_user_doc on doc_signatures(user_id, doc_id);
+#
+# Modo "delta" (FIRMA_GUARDADO=delta): si el PDF firmado es una actualización incremental del
+# original, se sube el original una vez a originales/<sha256>.pdf y por firma solo los bytes
+# añadidos (.delta). El fichero firmado es original + delta (ver reconstruir()).
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime
+
+BUCKET = "documentos_firmados"
+TABLA = "doc_signatures"
+REINTENTOS = 3
+BACKOFF_S = 0.5
+GUARDADO = os.getenv("FIRMA_GUARDADO") or "completo"   # completo | delta
+
+_originales_subidos: set[str] = set()
+_originales_lock = threading.Lock()
+
+
+def ruta_firmado(user_id: str, doc_id: str, sha256: str) -> str:
+    return f"signed/{user_id}/{doc_id}_{sha256[:16]}.pdf"
+
+def _con_reintentos(fn):
+    for intento in range(REINTENTOS):
+        try:
+            return fn()
+        except Exception:
+            if intento == REINTENTOS - 1:
+                raise
+            time.sleep(BACKOFF_S * 2 ** intento)
+
+def _subir_original(bucket, original) -> str:
+    """Sube el original compartido una sola vez (por contenido). Devuelve su PATH."""
+    path = f"originales/{original.sha256}.pdf"
+    if path in _originales_subidos:
+        return path
+    with _originales_lock:
+        if path not in _originales_subidos:
+            with open(original.ruta, "rb") as f:
+                data = f.read()
+            try:
+                _con_reintentos(lambda: bucket.upload(path, data, {"content-type": "application/pdf"}))
+            except Exception as e:
+                # Ya estaba subido (otro proceso o un arranque anterior)
+                if "exist" not in str(e).lower() and "duplicate" not in str(e).lower():
+                    raise
+            _originales_subidos.add(path)
+    return path
+
+def _delta_de(signed_pdf: bytes, original) -> bytes | None:
+    """Bytes añadidos si signed_pdf = original + actualización incremental; si no, None."""
+    n = os.path.getsize(original.ruta)
+    if len(signed_pdf) > n and hashlib.sha256(signed_pdf[:n]).hexdigest() == original.sha256:
+        return signed_pdf[n:]
+    return None
+
+def persistir_firma(sb, user_id: str, doc: dict, signed_pdf: bytes, original=None) -> str:
+    """
+    Sube el PDF firmado y registra la firma (una fila por usuario y documento).
+    Seguro de reintentar. Si el registro falla, borra el objeto recién subido para no
+    dejar huérfanos; si ni siquiera se puede comprobar el registro, lo conserva y relanza
+    el error original. Devuelve el PATH del objeto en el bucket privado.
+    original: PdfCacheado del que se firmó; necesario para el modo delta.
+    """
+    sha = hashlib.sha256(signed_pdf).hexdigest()
+    path = ruta_firmado(user_id, doc["id"], sha)
+    bucket = sb.storage.from_(BUCKET)
+
+    cuerpo, extra = signed_pdf, {}
+    delta = _delta_de(signed_pdf, original) if GUARDADO == "delta" and original is not None else None
+    if delta is not None:
+        extra["original_url"] = _subir_original(bucket, original)
+        path = path[:-len(".pdf")] + ".delta"
+        cuerpo = delta
+
+    _con_reintentos(lambda: bucket.upload(
+        path, cuerpo, {"content-type": "application/octet-stream" if extra else "application/pdf",
+                       "upsert": "true"}
+    ))
+    fila = {
+        "user_id": user_id,
+        "doc_id": doc["id"],
+        "doc_title": doc["title"],
+        "signed_url": path,                         # PATH en el bucket privado
+        "content_sha256": sha,
+        "signed_at": datetime.utcnow().isoformat(), # para mostrar fecha
+        **extra,
+    }
+    try:
+        _con_reintentos(lambda: sb.table(TABLA).upsert(fila, on_conflict="user_id,doc_id").execute())
+    except Exception as err:
+        try:
+            registrada = _registrada(sb, user_id, doc["id"], sha)
+        except Exception:
+            # Sin poder comprobarlo no se borra un objeto quizá referenciado, pero tampoco se da por buena
+            raise err from None
+        if registrada:
+            return path   # el upsert llegó aunque se perdiera la respuesta
+        try:
+            bucket.remove([path])
+        except Exception:
+            pass
+        raise
+    return path
+
+def reconstruir(sb, fila: dict) -> bytes:
+    """PDF firmado completo a partir de la fila de doc_signatures (completo o delta)."""
+    bucket = sb.storage.from_(BUCKET)
+    firmado = bucket.download(fila["signed_url"])
+    if fila.get("original_url"):
+        firmado = bucket.download(fila["original_url"]) + firmado
+    if fila.get("content_sha256") and hashlib.sha256(firmado).hexdigest() != fila["content_sha256"]:
+        raise ValueError("El PDF firmado reconstruido no coincide con su hash registrado.")
+    return firmado
+
+def _registrada(sb, user_id: str, doc_id: str, sha: str) -> bool:
+    """True si la fila de esta firma existe. Los errores de la consulta se propagan."""
+    rows = (sb.table(TABLA).select("content_sha256")
+              .eq("user_id", user_id).eq("doc_id", doc_id)
+              .execute().data) or []
+    return any(r.get("content_sha256") == sha for r in rows)
@@ -0,0 +1,147 @@
+# geocerca.py
+# Geocercas de las sedes (almacenes/oficinas) definidas en sedes.csv:
+#   id,nombre,lat,lon,radio_m,poligono
+# 'poligono' es opcional ("lat lon;lat lon;..."); si está, manda el polígono y el radio solo
+# sirve para la distancia mostrada. Se recarga si cambia el mtime del fichero.
+#
+# Comprobación: prefiltro por caja (lat/lon) y haversine vectorizado con numpy sobre las
+# candidatas. Con muchas sedes se indexan en una rejilla de celdas de CELDA_GRADOS para no
+# recorrerlas todas. Haversine (esfera) difiere de geodesic (elipsoide) < 0,5 %: < 0,5 m a 100 m.
+import csv
+import math
+import os
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SEDES_CSV = os.getenv("SEDES_CSV") or os.path.join(BASE_DIR, "sedes.csv")
+RADIO_TIERRA_M = 6371008.8
+CELDA_GRADOS = 0.05          # ~5,5 km de lado en latitud
+REJILLA_DESDE = 32           # por debajo basta con el prefiltro vectorizado sobre todas
+
+
+@dataclass(frozen=True)
+class Sede:
+    id: str
+    nombre: str
+    lat: float
+    lon: float
+    radio_m: float
+    poligono: tuple = ()     # ((lat, lon), ...)
+
+
+@dataclass(frozen=True)
+class Resultado:
+    sede: Sede | None            # sede dentro de cuya geocerca está el punto
+    cercana: Sede | None         # la más cercana (para el mensaje si no está en ninguna)
+    distancia_m: float | None    # distancia al centro de 'cercana'
+
+
+def _poligono(txt: str) -> tuple:
+    pts = []
+    for par in (txt or "").split(";"):
+        if par.strip():
+            lat, lon = par.split()
+            pts.append((float(lat), float(lon)))
+    return tuple(pts) if len(pts) >= 3 else ()
+
+def _dentro_poligono(lat: float, lon: float, pol: tuple) -> bool:
+    # Ray casting en el plano lat/lon; suficiente para recintos de unos cientos de metros
+    dentro = False
+    j = len(pol) - 1
+    for i in range(len(pol)):
+        (yi, xi), (yj, xj) = pol[i], pol[j]
+        if (yi > lat) != (yj > lat) and lon < (xj - xi) * (lat - yi) / (yj - yi) + xi:
+            dentro = not dentro
+        j = i
+    return dentro
+
+def haversine_m(lat, lon, lats, lons):
+    """Distancia en metros de (lat, lon) a cada punto de (lats, lons); admite arrays."""
+    p1, p2 = np.radians(lat), np.radians(lats)
+    dp, dl = p2 - p1, np.radians(np.asarray(lons) - lon)
+    a = np.sin(dp / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(dl / 2) ** 2
+    return 2 * RADIO_TIERRA_M * np.arcsin(np.sqrt(a))
+
+
+class Geocercas:
+    def __init__(self, sedes: list[Sede]):
+        self.sedes = sedes
+        self._lat = np.array([s.lat for s in sedes], dtype=float)
+        self._lon = np.array([s.lon for s in sedes], dtype=float)
+        # Caja envolvente de cada geocerca (círculo o polígono) en grados
+        cajas = []
+        for s in sedes:
+            if s.poligono:
+                la, lo = zip(*s.poligono)
+                cajas.append((min(la), max(la), min(lo), max(lo)))
+            else:
+                dlat = math.degrees(s.radio_m / RADIO_TIERRA_M)
+                dlon = dlat / max(math.cos(math.radians(s.lat)), 1e-6)
+                cajas.append((s.lat - dlat, s.lat + dlat, s.lon - dlon, s.lon + dlon))
+        self._cajas = np.array(cajas, dtype=float).reshape(-1, 4)
+        self._rejilla: dict[tuple, np.ndarray] | None = None
+        if len(sedes) >= REJILLA_DESDE:
+            celdas: dict[tuple, list] = {}
+            for i, (la0, la1, lo0, lo1) in enumerate(self._cajas):
+                for cy in range(self._celda(la0), self._celda(la1) + 1):
+                    for cx in range(self._celda(lo0), self._celda(lo1) + 1):
+                        celdas.setdefault((cy, cx), []).append(i)
+            self._rejilla = {k: np.array(v) for k, v in celdas.items()}
+
+    @staticmethod
+    def _celda(grados: float) -> int:
+        return math.floor(grados / CELDA_GRADOS)
+
+    def _candidatas(self, lat: float, lon: float) -> np.ndarray:
+        if self._rejilla is not None:
+            idx = self._rejilla.get((self._celda(lat), self._celda(lon)))
+            if idx is None:
+                return np.empty(0, dtype=int)
+        else:
+            idx = np.arange(len(self.sedes))
+        c = self._cajas[idx]
+        return idx[(c[:, 0] <= lat) & (lat <= c[:, 1]) & (c[:, 2] <= lon) & (lon <= c[:, 3])]
+
+    def comprobar(self, lat: float, lon: float) -> Resultado:
+        """Sede en cuya geocerca cae el punto (la más cercana si hay varias) y la más cercana en general."""
+        if not self.sedes:
+            return Resultado(None, None, None)
+        cand = self._candidatas(lat, lon)
+        if cand.size:
+            d = haversine_m(lat, lon, self._lat[cand], self._lon[cand])
+            for k in np.argsort(d):
+                s = self.sedes[cand[k]]
+                if (_dentro_poligono(lat, lon, s.poligono) if s.poligono else d[k] <= s.radio_m):
+                    return Resultado(s, s, float(d[k]))
+        # Fuera de todas: distancia a la más cercana, en un solo paso vectorizado
+        d_all = haversine_m(lat, lon, self._lat, self._lon)
+        i = int(np.argmin(d_all))
+        return Resultado(None, self.sedes[i], float(d_all[i]))
+
+    def por_id(self, sede_id: str) -> Sede | None:
+        return next((s for s in self.sedes if s.id == sede_id), None)
+
+
+def _leer_sedes(ruta: str) -> list[Sede]:
+    with open(ruta, newline="", encoding="utf-8-sig") as f:
+        filas = [{(k or "").strip(): (v or "").strip() for k, v in row.items()} for row in csv.DictReader(f)]
+    return [Sede(id=r["id"], nombre=r.get("nombre") or r["id"], lat=float(r["lat"]), lon=float(r["lon"]),
+                 radio_m=float(r.get("radio_m") or 100), poligono=_poligono(r.get("poligono", "")))
+            for r in filas if r.get("id")]
+
+
+_lock = threading.Lock()
+_cache: dict = {"mtime": None, "geo": None}
+
+def get_geocercas() -> Geocercas:
+    """Geocercas compartidas por el proceso; un stat() por llamada para detectar cambios."""
+    mt = os.stat(SEDES_CSV).st_mtime_ns
+    if _cache["mtime"] != mt:
+        with _lock:
+            if _cache["mtime"] != mt:
+                _cache["geo"] = Geocercas(_leer_sedes(SEDES_CSV))
+                _cache["mtime"] = mt
+    return _cache["geo"]
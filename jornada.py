@@ -0,0 +1,161 @@
+# jornada.py
+# Emparejado de marcas Entrada/Salida y horas trabajadas por día (registro de jornada).
+# Regla: en cada día, ordenado por hora, una Entrada seguida de una Salida forma un tramo;
+# cualquier otra marca queda suelta ("HH:MM - ?") y no suma horas.
+#
+# Todo el rango se procesa de una vez con arrays: como una Salida nunca abre tramo, una Entrada
+# no puede haber sido "consumida" por el tramo anterior, y el recorrido secuencial equivale a
+# marcar cada Entrada cuyo siguiente registro del mismo día es una Salida.
+#
+# Los segundos trabajados salen de restar epochs (instantes reales), no horas de pared: un tramo
+# 01:00-04:00 dura 2 h el día del salto de marzo y 4 h el del retraso de octubre. La hora de
+# pared solo se usa para mostrar.
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import tiempo
+
+
+def _epoch(df: pd.DataFrame) -> np.ndarray:
+    # Con la columna epoch del espejo local (calculada desde fecha_utc) no hace falta parsear textos
+    if "epoch" in df and df["epoch"].notna().all():
+        return df["epoch"].to_numpy(dtype="int64")
+    return tiempo.local_a_epoch(df["fecha_local"])
+
+
+def tramos(df: pd.DataFrame, por: str | None = None) -> pd.DataFrame:
+    """
+    Un registro por tramo o marca suelta, en orden: [por,] dia ('YYYY-MM-DD'), entrada,
+    salida (hora de pared local; NaT si la marca queda suelta) y segundos trabajados (por
+    epoch). 'por' agrupa además por esa columna (p. ej. "empleado") para procesar varios
+    empleados a la vez.
+    """
+    claves = [por] if por else []
+    if df.empty:
+        return pd.DataFrame(columns=claves + ["dia", "entrada", "salida", "segundos"])
+    e = _epoch(df)
+    d = pd.DataFrame({
+        **({por: df[por].to_numpy()} if por else {}),
+        "dia": df["fecha_local"].str[:10].to_numpy(),
+        "e": e,
+        "t": tiempo.epoch_a_local(e).to_numpy(),
+        "tipo": df["tipo"].to_numpy(),
+    })
+    # Orden estable: a igual instante se respeta el orden de llegada, como el recorrido por día
+    d = d.sort_values(claves + ["e"], kind="stable").reset_index(drop=True)
+
+    n = len(d)
+    t = d["t"].to_numpy()
+    e = d["e"].to_numpy()
+    tipo = d["tipo"].to_numpy()
+    mismo_grupo = d["dia"].to_numpy()[1:] == d["dia"].to_numpy()[:-1]
+    if por:
+        mismo_grupo &= d[por].to_numpy()[1:] == d[por].to_numpy()[:-1]
+
+    abre = np.zeros(n, dtype=bool)
+    abre[:-1] = (tipo[:-1] == "Entrada") & (tipo[1:] == "Salida") & mismo_grupo
+    cierra = np.zeros(n, dtype=bool)
+    cierra[1:] = abre[:-1]
+
+    salida = np.full(n, np.datetime64("NaT"), dtype=t.dtype)
+    salida[abre] = t[np.flatnonzero(abre) + 1]
+    segundos = np.zeros(n, dtype="float64")
+    segundos[abre] = e[np.flatnonzero(abre) + 1] - e[abre]
+    filas = ~cierra
+    out = d.loc[filas, claves + ["dia"]].reset_index(drop=True)
+    out["entrada"] = t[filas]
+    out["salida"] = salida[filas]
+    out["segundos"] = segundos[filas]
+    return out
+
+def resumen_por_dia(df: pd.DataFrame, dias: list[date] | None = None, por: str | None = None) -> pd.DataFrame:
+    """
+    Una fila por día ([por,] dia, marcas, horas) a partir de fichajes con fecha_local
+    'YYYY-MM-DD HH:MM:SS'. Con 'dias' se devuelven exactamente esos días (para cada valor de
+    'por'), los que no tienen marcas vacíos y con 0 h; sin él, solo los días con marcas.
+    """
+    claves = [por] if por else []
+    tr = tramos(df, por)
+    if tr.empty:
+        marcas, segundos = pd.Series(dtype=object), pd.Series(dtype=float)
+    else:
+        texto = tr["entrada"].dt.strftime("%H:%M") + " - " + tr["salida"].dt.strftime("%H:%M").fillna("?")
+        g = tr.assign(texto=texto).groupby(claves + ["dia"], sort=True)
+        marcas, segundos = g["texto"].agg(list), g["segundos"].sum()
+
+    if por:
+        claves_idx = [(k, dia) for k, dia in marcas.index]
+    else:
+        claves_idx = [(dia,) for dia in marcas.index]
+    res = pd.DataFrame(claves_idx, columns=claves + ["dia"])
+    res["dia"] = [date.fromisoformat(x) for x in res["dia"]]
+    res["marcas"] = list(marcas)
+    res["horas"] = [round(s / 3600.0, 2) for s in segundos]
+
+    if dias is not None:
+        if por:
+            base = pd.MultiIndex.from_product([sorted(res[por].unique()), list(dias)], names=[por, "dia"])
+        else:
+            base = pd.Index(list(dias), name="dia")
+        res = res.set_index(claves + ["dia"]).reindex(base).reset_index()
+        res["marcas"] = [m if isinstance(m, list) else [] for m in res["marcas"]]
+        res["horas"] = res["horas"].fillna(0.0)
+    return res[claves + ["dia", "marcas", "horas"]]
+
+def jornada_por_dia(df: pd.DataFrame, por: str = "empleado") -> pd.DataFrame:
+    """
+    Resumen completo por [por,] día para registro de jornada: segundos, tramos, sueltas,
+    primera_entrada y ultima_salida ('HH:MM:SS' o None), marcas y horas.
+    """
+    res = resumen_por_dia(df, por=por)
+    if res.empty:
+        return res.assign(segundos=[], tramos=[], sueltas=[], primera_entrada=[], ultima_salida=[])
+    tr = tramos(df, por)
+    g = tr.groupby([por, "dia"], sort=True)
+    res["segundos"] = g["segundos"].sum().to_numpy().astype("int64")
+    res["tramos"] = g["salida"].count().to_numpy()
+    res["sueltas"] = g["entrada"].size().to_numpy() - res["tramos"]
+    hora = df["fecha_local"].str[11:19]
+    claves = [df[por], df["fecha_local"].str[:10].rename("dia")]
+    ent = hora[df["tipo"] == "Entrada"].groupby([c[df["tipo"] == "Entrada"] for c in claves]).min()
+    sal = hora[df["tipo"] == "Salida"].groupby([c[df["tipo"] == "Salida"] for c in claves]).max()
+    idx = list(zip(res[por], [d.isoformat() for d in res["dia"]]))
+    res["primera_entrada"] = [ent.get(k) for k in idx]
+    res["ultima_salida"] = [sal.get(k) for k in idx]
+    return res
+
+def validar_pares(pares: list[dict], df: pd.DataFrame) -> dict[int, str]:
+    """
+    Comprueba pares manuales {"dia": date, "entrada": datetime, "salida": datetime} contra
+    los fichajes ya cargados (df) y entre sí. Devuelve {índice del par: motivo} de los que
+    no valen: salida no posterior, solape con un tramo existente, una marca suelta dentro
+    del intervalo o solape con otro par del mismo lote.
+    """
+    errores: dict[int, str] = {}
+    existentes = []   # (inicio, fin, texto)
+    if not df.empty:
+        for r in tramos(df).itertuples(index=False):
+            ini = pd.Timestamp(r.entrada).to_pydatetime()
+            if pd.isna(r.salida):
+                existentes.append((ini, ini, f"la marca suelta de las {ini:%H:%M}"))
+            else:
+                fin = pd.Timestamp(r.salida).to_pydatetime()
+                existentes.append((ini, fin, f"el tramo {ini:%H:%M}-{fin:%H:%M}"))
+    for i, p in enumerate(pares):
+        e, s = p["entrada"], p["salida"]
+        if s <= e:
+            errores[i] = "La hora de salida debe ser posterior a la de entrada."
+            continue
+        # Intervalos semiabiertos [e, s): un tramo puede empezar justo cuando acaba otro
+        choque = next((t for ini, fin, t in existentes
+                       if (ini < s and e < fin) or (ini == fin and e <= ini < s)), None)
+        if choque:
+            errores[i] = f"Se solapa con {choque} del {p['dia']:%d/%m}."
+            continue
+        otro = next((j for j, q in enumerate(pares[:i]) if j not in errores
+                     and q["entrada"] < s and e < q["salida"]), None)
+        if otro is not None:
+            errores[i] = f"Se solapa con la fila {otro + 1} de este ajuste."
+    return errores
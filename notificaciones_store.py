@@ -0,0 +1,170 @@
+# notificaciones_store.py
+# Notificaciones en SQLite con índice (usuario, leido) y contador de no leídas por usuario.
+# El contador lo mantienen triggers, así el badge de la campana es una única lectura por clave.
+#
+# notificaciones.csv sigue siendo la vía de entrada de los procesos externos: las filas que se
+# le añaden se importan de forma incremental (offset en bytes guardado en notificaciones_meta),
+# comprobando con un stat() si el fichero ha cambiado. Desde la app, usar crear().
+import csv
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+NOTIF_CSV = os.getenv("NOTIF_CSV") or "notificaciones.csv"   # entrada de procesos externos
+NOTIF_DB = os.getenv("NOTIF_DB") or "notificaciones.db"
+
+_schema_lock = threading.Lock()
+_schema_ok: set[str] = set()
+_csv_visto: dict[tuple, tuple] = {}   # (db, csv) -> (mtime_ns, tamaño) ya importado
+
+
+def get_conn(db_file: str = NOTIF_DB):
+    d = os.path.dirname(db_file)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    return sqlite3.connect(db_file, timeout=30)
+
+def ensure_schema(db_file: str = NOTIF_DB):
+    """Crea tablas, índices y triggers (una vez por proceso)."""
+    if db_file in _schema_ok:
+        return
+    with _schema_lock:
+        if db_file in _schema_ok:
+            return
+        with get_conn(db_file) as conn:
+            cur = conn.cursor()
+            cur.execute("PRAGMA journal_mode=WAL;")
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS notificaciones (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    usuario TEXT NOT NULL,
+                    titulo TEXT,
+                    fecha TEXT,
+                    leido INTEGER NOT NULL DEFAULT 0 CHECK (leido IN (0, 1))
+                );
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_notificaciones_usuario_leido ON notificaciones(usuario, leido);")
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS notificaciones_contador (
+                    usuario TEXT PRIMARY KEY,
+                    no_leidas INTEGER NOT NULL DEFAULT 0
+                );
+            """)
+            cur.execute("CREATE TABLE IF NOT EXISTS notificaciones_meta (clave TEXT PRIMARY KEY, valor TEXT);")
+            # Contador de no leídas mantenido en la misma transacción que el cambio
+            cur.executescript("""
+                CREATE TRIGGER IF NOT EXISTS trg_notif_ins AFTER INSERT ON notificaciones
+                WHEN NEW.leido = 0 BEGIN
+                    INSERT INTO notificaciones_contador(usuario, no_leidas) VALUES (NEW.usuario, 1)
+                    ON CONFLICT(usuario) DO UPDATE SET no_leidas = no_leidas + 1;
+                END;
+                CREATE TRIGGER IF NOT EXISTS trg_notif_leida AFTER UPDATE OF leido ON notificaciones
+                WHEN OLD.leido = 0 AND NEW.leido = 1 BEGIN
+                    UPDATE notificaciones_contador SET no_leidas = no_leidas - 1 WHERE usuario = NEW.usuario;
+                END;
+                CREATE TRIGGER IF NOT EXISTS trg_notif_no_leida AFTER UPDATE OF leido ON notificaciones
+                WHEN OLD.leido = 1 AND NEW.leido = 0 BEGIN
+                    INSERT INTO notificaciones_contador(usuario, no_leidas) VALUES (NEW.usuario, 1)
+                    ON CONFLICT(usuario) DO UPDATE SET no_leidas = no_leidas + 1;
+                END;
+                CREATE TRIGGER IF NOT EXISTS trg_notif_del AFTER DELETE ON notificaciones
+                WHEN OLD.leido = 0 BEGIN
+                    UPDATE notificaciones_contador SET no_leidas = no_leidas - 1 WHERE usuario = OLD.usuario;
+                END;
+            """)
+            conn.commit()
+        _schema_ok.add(db_file)
+
+def _meta(conn, clave: str) -> str | None:
+    row = conn.execute("SELECT valor FROM notificaciones_meta WHERE clave = ?;", (clave,)).fetchone()
+    return row[0] if row else None
+
+def _set_meta(conn, clave: str, valor):
+    conn.execute("INSERT INTO notificaciones_meta(clave, valor) VALUES (?, ?) "
+                 "ON CONFLICT(clave) DO UPDATE SET valor = excluded.valor;", (clave, str(valor)))
+
+def importar_csv(db_file: str = NOTIF_DB, csv_file: str = NOTIF_CSV) -> int:
+    """
+    Importa las filas añadidas a notificaciones.csv (usuario,titulo,fecha,leido) desde la última
+    vez. El CSV no se modifica. Si el fichero encoge (se ha reescrito) se vuelve a leer entero.
+    Devuelve cuántas filas se han importado.
+    """
+    try:
+        st_csv = os.stat(csv_file)
+    except OSError:
+        return 0
+    firma = (st_csv.st_mtime_ns, st_csv.st_size)
+    if _csv_visto.get((db_file, csv_file)) == firma:
+        return 0
+    ensure_schema(db_file)
+    conn = get_conn(db_file)
+    try:
+        # IMMEDIATE: dos procesos no pueden leer el mismo offset e importar las mismas filas
+        conn.execute("BEGIN IMMEDIATE;")
+        offset = int(_meta(conn, "csv_offset") or 0)
+        if offset > st_csv.st_size:
+            offset = 0
+        with open(csv_file, "rb") as f:
+            cabecera = f.readline()
+            datos_desde = len(cabecera)
+            f.seek(max(offset, datos_desde))
+            nuevo = f.read()
+        # Solo líneas completas; una escritura a medias se lee en la siguiente vuelta
+        nuevo = nuevo[:nuevo.rfind(b"\n") + 1]
+        campos = next(csv.reader([cabecera.decode("utf-8-sig").strip()]), [])
+        filas = []
+        for r in csv.DictReader(nuevo.decode("utf-8").splitlines(), fieldnames=campos):
+            if not (r.get("usuario") or "").strip():
+                continue
+            try:
+                leido = 1 if int(float(r.get("leido") or 0)) else 0
+            except ValueError:
+                leido = 0
+            filas.append((r.get("usuario") or "", r.get("titulo") or "", r.get("fecha") or "", leido))
+        conn.executemany("INSERT INTO notificaciones(usuario, titulo, fecha, leido) VALUES (?, ?, ?, ?);", filas)
+        _set_meta(conn, "csv_offset", max(offset, datos_desde) + len(nuevo))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    _csv_visto[(db_file, csv_file)] = firma
+    return len(filas)
+
+
+def no_leidas(usuario: str, db_file: str = NOTIF_DB) -> int:
+    ensure_schema(db_file)
+    importar_csv(db_file)
+    with get_conn(db_file) as conn:
+        row = conn.execute("SELECT no_leidas FROM notificaciones_contador WHERE usuario = ?;", (usuario,)).fetchone()
+    return int(row[0]) if row else 0
+
+def pendientes(usuario: str, limit: int = 50, db_file: str = NOTIF_DB) -> list[dict]:
+    """No leídas del usuario, más recientes primero."""
+    ensure_schema(db_file)
+    importar_csv(db_file)
+    with get_conn(db_file) as conn:
+        rows = conn.execute(
+            "SELECT id, titulo, fecha FROM notificaciones WHERE usuario = ? AND leido = 0 "
+            "ORDER BY id DESC LIMIT ?;", (usuario, int(limit))
+        ).fetchall()
+    return [{"id": r[0], "titulo": r[1], "fecha": r[2]} for r in rows]
+
+def marcar_todas_leidas(usuario: str, db_file: str = NOTIF_DB) -> int:
+    """Marca como leídas solo las filas no leídas de ese usuario. Devuelve cuántas."""
+    ensure_schema(db_file)
+    with get_conn(db_file) as conn:
+        cur = conn.execute("UPDATE notificaciones SET leido = 1 WHERE usuario = ? AND leido = 0;", (usuario,))
+        conn.commit()
+        return cur.rowcount
+
+def crear(usuario: str, titulo: str, fecha: str | None = None, db_file: str = NOTIF_DB) -> int:
+    ensure_schema(db_file)
+    fecha = fecha or datetime.now().strftime("%Y-%m-%d %H:%M")
+    with get_conn(db_file) as conn:
+        cur = conn.execute("INSERT INTO notificaciones(usuario, titulo, fecha) VALUES (?, ?, ?);",
+                           (usuario, titulo, fecha))
+        conn.commit()
+        return cur.lastrowid
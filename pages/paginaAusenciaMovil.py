@@ -15,8 +15,9 @@ if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 import supabase_login_shim as auth
 import ui_pages as ui
-from api_client import (post_vacaciones, get_vacaciones, cancel_vacacion,
-                        post_baja, get_bajas)
+import api_cache
+from api_client import post_vacaciones, cancel_vacacion, post_baja
+from api_cache import get_vacaciones, get_bajas
 
 st.set_page_config(
     layout="wide",
@@ -105,7 +106,10 @@ def ensure_tables():
 
 def guardar_vacaciones(usuario, fi, ff, dias, comentario):
     user_id = st.session_state["user_id"]
-    return post_vacaciones(user_id, usuario, fi, ff, dias, comentario)
+    try:
+        return post_vacaciones(user_id, usuario, fi, ff, dias, comentario)
+    finally:
+        api_cache.invalidar(user_id, "vacaciones")
 
 def listar_vacaciones(usuario):
     user_id = st.session_state["user_id"]
@@ -114,12 +118,18 @@ def listar_vacaciones(usuario):
 
 def cancelar_vacacion(id_, usuario):
     user_id = st.session_state["user_id"]
-    return cancel_vacacion(user_id, id_)
+    try:
+        return cancel_vacacion(user_id, id_)
+    finally:
+        api_cache.invalidar(user_id, "vacaciones")
 
 def guardar_baja(usuario, tipo, fi, ff, descripcion, archivos_files):
     user_id = st.session_state["user_id"]
     # aquí pasamos los UploadedFile directamente (no guardamos al disco local)
-    return post_baja(user_id, usuario, tipo, fi, ff, descripcion, archivos_files)
+    try:
+        return post_baja(user_id, usuario, tipo, fi, ff, descripcion, archivos_files)
+    finally:
+        api_cache.invalidar(user_id, "bajas")
 
 def listar_bajas(usuario):
     user_id = st.session_state["user_id"]
@@ -1,15 +1,16 @@
 # pages/paginaDocumentos.py
-import io, time, requests
-from datetime import datetime
 import streamlit as st
 from streamlit_drawable_canvas import st_canvas
-from PIL import Image
-import fitz  # PyMuPDF
 
 # App: login / menús (tu shim y helpers)
 import supabase_login_shim as auth
 import ui_pages as ui
-from supabase import create_client
+import supabase_clients as sbc
+import pdf_cache
+import pdf_preview
+import firma_jobs
+import api_cache
+from user_directory import get_directorio
 
     
 #st.set_page_config(page_title="Documentos", layout="wide")
@@ -37,15 +38,9 @@ div[data-testid="stToolbar"] { display: none !important; visibility: hidden !imp
 auth.generarLogin(__file__)
 ui.generarMenuRoles(st.session_state.get("usuario", ""))
 
-# ---- Supabase client (usa tus secrets) ----
-from supabase import create_client
-
-SUPABASE_URL = st.secrets["SUPABASE_URL"]
+# ---- Supabase client (usa tus secrets; uno por proceso, no por rerun) ----
 # En tu proyecto la anon key está como VITE_SUPABASE_ANON_KEY (deja fallback por si acaso)
-SUPABASE_ANON_KEY = st.secrets.get("VITE_SUPABASE_ANON_KEY") or st.secrets["SUPABASE_ANON_KEY"]
-SR_KEY   = st.secrets.get("SUPABASE_SERVICE_ROLE")
-
-sb = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+sb = sbc.get_client()
 
 # ---------- Identidad (DEBE existir usuario autenticado en Supabase Auth) ----------
 usuario_login = st.session_state.get("usuario", "").strip().lower()
@@ -53,23 +48,19 @@ if not usuario_login:
     st.warning("Acceso denegado. Inicia sesión.")
     st.stop()
 
-user_id   = None
 user_name = usuario_login.split("@")[0]
 user_slug = user_name
 
-# Si tenemos Service Role, intentamos resolver el user_id en Supabase Auth
-if SR_KEY:
-   try:
-       admin = create_client(SUPABASE_URL, SR_KEY)
-       page = admin.auth.admin.list_users(page=1, per_page=1000)
-       users = page.get("users") if isinstance(page, dict) else getattr(page, "users", [])
-       for u in users:
-           email = (u.get("email") if isinstance(u, dict) else getattr(u, "email", "")) or ""
-           if email.lower() == usuario_login:
-               user_id = u.get("id") if isinstance(u, dict) else getattr(u, "id", None)
-               break
-   except Exception:
-       pass 
+# El login (supabase_login_shim) ya guarda el user_id de Supabase Auth en sesión
+user_id = st.session_state.get("user_id")
+if user_id:
+    sbc.recordar_user_id(usuario_login, user_id)
+else:
+    # Fallback: caché email -> user_id con TTL (lista paginada con service role si hace falta)
+    try:
+        user_id = sbc.resolver_user_id(usuario_login)
+    except Exception:
+        pass
 #if not user_id:
     #st.error("No se pudo obtener tu usuario autenticado en Supabase.")
 
@@ -97,6 +88,9 @@ DOCS = [
     },
 ]
 
+# Descarga/revalida los originales en segundo plano la primera vez que arranca el proceso
+pdf_cache.precalentar([d["url"] for d in DOCS])
+
 st.subheader("Documentos")
 
 # ---------- Traer firmas del usuario (por user_id) ----------
@@ -113,6 +107,46 @@ else:
 
 firmas_by_id = {r["doc_id"]: r for r in firmas}
 
+
+@st.fragment(run_every=1.0)
+def estado_firma(doc_id: str, job_id: str):
+    """Consulta el trabajo de firma cada segundo sin rerun de toda la página."""
+    trabajo = firma_jobs.estado(job_id)
+    if trabajo is None or trabajo.estado == firma_jobs.OK:
+        st.session_state["firma_jobs"].pop(doc_id, None)
+        if trabajo is not None:
+            st.toast("¡Firmado!")
+        st.rerun()
+    elif trabajo.estado == firma_jobs.ERROR:
+        st.error(f"No se pudo subir el documento firmado: {trabajo.error}")
+        if st.button("Volver a intentar", key=f"retry_{doc_id}"):
+            st.session_state["firma_jobs"].pop(doc_id, None)
+            st.rerun()
+    else:
+        st.info("⏳ Firmando y enviando…" if trabajo.estado == firma_jobs.PROCESANDO
+                else "⏳ En cola para firmar…")
+
+@st.fragment
+def visor(doc: dict):
+    """Visor en la app: solo se renderiza la página que se está viendo (y se precarga la siguiente)."""
+    n_pag = pdf_preview.num_paginas(doc["url"])
+    if n_pag == 0:
+        st.warning("No se puede mostrar la vista previa: el PDF está vacío o no se puede leer.")
+        return
+    k = f"visor_{doc['id']}"
+    actual = min(st.session_state.get(k, 0), n_pag - 1)
+    ancho = pdf_preview.ANCHO
+    st.image(pdf_preview.pagina(doc["url"], actual, ancho), use_column_width=True)
+    pdf_preview.precargar(doc["url"], actual + 1, ancho)
+    c1, c2, c3 = st.columns([1, 2, 1])
+    if c1.button("◀", key=f"{k}_prev", disabled=actual == 0, use_container_width=True):
+        st.session_state[k] = actual - 1
+        st.rerun(scope="fragment")
+    c2.caption(f"Página {actual + 1} de {n_pag}")
+    if c3.button("▶", key=f"{k}_next", disabled=actual >= n_pag - 1, use_container_width=True):
+        st.session_state[k] = actual + 1
+        st.rerun(scope="fragment")
+
 # ---------- Listado ----------
 for doc in DOCS:
     st.divider()
@@ -120,7 +154,13 @@ for doc in DOCS:
 
     with left:
         st.subheader(doc["title"])
-        st.link_button("🔍 Ver documento", doc["url"])
+        # El toggle evita renderizar nada hasta que el empleado abre el documento
+        if st.toggle("🔍 Ver documento", key=f"ver_{doc['id']}"):
+            try:
+                visor(doc)
+            except Exception as e:
+                st.warning(f"No se pudo mostrar la vista previa: {e}")
+            st.link_button("Descargar PDF", doc["url"])
 
         if doc["id"] in firmas_by_id:
             f = firmas_by_id[doc["id"]]
@@ -139,6 +179,11 @@ for doc in DOCS:
             st.success("Ya está firmado")
             continue
 
+        job_id = st.session_state.get("firma_jobs", {}).get(doc["id"])
+        if job_id:
+            estado_firma(doc["id"], job_id)
+            continue
+
         with st.expander("✍️ Firmar este documento", expanded=False):
             st.write("Traza tu firma en el recuadro (puedes usar el dedo).")
 
@@ -161,73 +206,22 @@ for doc in DOCS:
                     st.warning("Dibuja tu firma antes de enviar.")
                     st.stop()
 
-                # 2) Descarga PDF original
+                # 2-6) Estampado, subida y registro en segundo plano (firma_jobs)
                 try:
-                    pdf_resp = requests.get(doc["url"], timeout=20)
-                    pdf_resp.raise_for_status()
-                    pdf_bytes = pdf_resp.content
-                except Exception as e:
-                    st.error(f"No se pudo descargar el PDF original: {e}")
+                    job_id = firma_jobs.encolar(sb, user_id, user_name, doc, imgdata,
+                                                json_data=getattr(canvas_res, "json_data", None))
+                except firma_jobs.ColaLlena as e:
+                    st.warning(str(e))
                     st.stop()
-
-                # 3) Convierte firma a PNG y recorta
-                img = Image.fromarray(imgdata.astype("uint8")).convert("RGBA")
-                bbox = img.getbbox()
-                if bbox:
-                    img = img.crop(bbox)
-                buf = io.BytesIO()
-                img.save(buf, format="PNG")
-                sig_png = buf.getvalue()
-
-                # 4) Estampa firma en la última página (abajo derecha)
-                pdf_in = fitz.open(stream=pdf_bytes, filetype="pdf")
-                page = pdf_in[-1]
-                rect = page.rect
-
-                pix = fitz.Pixmap(sig_png)
-                target_w = 180
-                scale = target_w / pix.width
-                new_w = target_w
-                new_h = int(pix.height * scale)
-
-                x = rect.x1 - new_w - 36
-                y = rect.y1 - new_h - 36
-                page.insert_image(fitz.Rect(x, y, x + new_w, y + new_h), stream=sig_png)
-
-                text = f"Firmado por {user_name} — {datetime.now().strftime('%d/%m/%Y %H:%M')}"
-                page.insert_text((36, rect.y1 - 36), text, fontsize=10, color=(0, 0, 0))
-
-                out = io.BytesIO()
-                pdf_in.save(out)
-                pdf_in.close()
-                signed_pdf = out.getvalue()
-
-                # 5) Subir a Storage (bucket PRIVADO) guardando SOLO el PATH
-                path = f"signed/{user_id}/{doc['id']}_{int(time.time())}.pdf"
-                try:
-                    sb.storage.from_("documentos_firmados").upload(
-                        path, signed_pdf, {"content-type": "application/pdf"}
-                    )
-                    sb.table("doc_signatures").insert({
-                        "user_id": user_id,
-                        "doc_id": doc["id"],
-                        "doc_title": doc["title"],
-                        "signed_url": path,
-                        "signed_at": datetime.utcnow().isoformat()
-                    }).execute()
-                except Exception as e:
-                    st.error(f"No se pudo subir el documento firmado: {e}")
-                    st.stop()
-
-                # 6) Registrar en BD (user_id + path)
-                sb.table("doc_signatures").insert({
-                    "user_id": user_id,
-                    "doc_id": doc["id"],
-                    "doc_title": doc["title"],
-                    "signed_url": path,                         # PATH en el bucket privado
-                    "signed_at": datetime.utcnow().isoformat()  # para mostrar fecha
-                }).execute()
-
-                st.success("Documento firmado y enviado correctamente.")
-                st.toast("¡Firmado!")
+                st.session_state.setdefault("firma_jobs", {})[doc["id"]] = job_id
                 st.rerun()
+
+# ---------- Métricas de la cola de firma (solo admin) ----------
+_yo = get_directorio().buscar(usuario_login)
+if _yo is not None and _yo.get("rol") == "admin":
+    with st.expander("Métricas de firma"):
+        st.json(firma_jobs.metricas())
+        st.caption("Vista previa de documentos")
+        st.json(pdf_preview.stats())
+        st.caption("Caché de lecturas del backend")
+        st.json(api_cache.stats())
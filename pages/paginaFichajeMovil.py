@@ -1,8 +1,7 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime, timezone, timedelta
-import sqlite3
-import hmac, hashlib, base64, time
+from datetime import date, datetime, timedelta
+import time
 
 # Login y componentes
 #import login as login
@@ -12,24 +11,23 @@ if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 import supabase_login_shim as auth
 import ui_pages as ui
-from api_client import post_fichaje as _post_fichaje, get_fichajes as _get_fichajes
+import fichajes_store as store
+import fichajes_outbox as outbox
+import jornada
+import tiempo
+import geocerca
+import qr_tokens
 from streamlit_geolocation import streamlit_geolocation
-from geopy.distance import geodesic
 
 # Dependencias opcionales para QR
 # - streamlit_qrcode_scanner (preferido si está instalado)
-# - Pillow + pyzbar como fallback por imagen
+# - Pillow + pyzbar como fallback por imagen (ver qr_decode)
 try:
     from streamlit_qrcode_scanner import qrcode_scanner  # type: ignore
 except Exception:
     qrcode_scanner = None
 
-try:
-    from PIL import Image
-    from pyzbar.pyzbar import decode as decode_qr  # type: ignore
-except Exception:
-    Image = None
-    decode_qr = None
+import qr_decode
 
 st.set_page_config(
     layout="wide",
@@ -59,9 +57,9 @@ DB_RRHH     = os.path.join(BASE_DIR, "rrhh.db")
 BAJAS_DIR   = os.path.join(BASE_DIR, "bajas_adjuntos")
 os.makedirs(BAJAS_DIR, exist_ok=True)
 
-# Coordenadas de la oficina (lat, lon) y radio permitido (km)
-OFFICE_COORD = (41.51762, 2.19930)
-DISTANCIA_MAXIMA = 0.1  # 100 m
+# Sedes (coordenadas, radio o polígono) en sedes.csv; ver geocerca.py
+# Segundos durante los que se reutiliza la última ubicación sin volver a pedir el GPS
+GEO_FRESCURA_S = int(st.secrets.get("GEO_FRESCURA_S", 120))
 
 # ======== Login ========
 auth.generarLogin(__file__)    # garantiza sesión
@@ -73,116 +71,58 @@ TABLE = "fichajes"
 
 
 
-def get_conn():
-    os.makedirs(os.path.dirname(DB_FILE), exist_ok=True)
-    return sqlite3.connect(DB_FILE)
-
 def ensure_schema():
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute(f"""
-            CREATE TABLE IF NOT EXISTS {TABLE} (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                empleado TEXT NOT NULL,
-                fecha_local TEXT NOT NULL,   -- 'YYYY-MM-DD HH:MM:SS'
-                fecha_utc   TEXT NOT NULL,   -- 'YYYY-MM-DD HH:MM:SS' (UTC)
-                tipo TEXT NOT NULL CHECK (tipo IN ('Entrada','Salida')),
-                observaciones TEXT,
-                fuente TEXT DEFAULT 'movil',
-                created_at_utc TEXT DEFAULT (datetime('now'))
-            );
-        """)
-        conn.commit()
+    # Tabla compartida con paginaModFechaMovil; el esquema vive en fichajes_store
+    store.ensure_schema(DB_FILE)
+    outbox.ensure_schema(DB_FILE)
 
 def insertar_fichaje(empleado: str, tipo: str, observaciones: str, *, fuente: str = "movil") -> dict:
-    """Inserta el fichaje en el backend."""
+    """Guarda el fichaje en la bandeja local; el worker lo envía al backend con reintentos."""
     user_id = st.session_state["user_id"]
     try:
-        return _post_fichaje(
+        return outbox.encolar(
+            DB_FILE,
             user_id=user_id,
             empleado=empleado,
             tipo=tipo,
-            observ=observaciones,
+            observaciones=observaciones,
             fuente=fuente,
         )
     except Exception as e:
         st.error(f"No se pudo registrar el fichaje: {e}")
         raise
+    # La caché de lecturas la invalida el outbox cuando el backend confirma el envío
 
 
-def cargar_historial(limit: int = 100, empleado_filtro: str | None = None) -> pd.DataFrame:
-    """Carga historial desde el backend, mantiene filtro por empleado y orden DESC."""
+def cargar_historial(desde: date, hasta: date, empleado_filtro: str | None = None,
+                     sincronizar: bool = True) -> pd.DataFrame:
+    """Sincroniza el delta con el backend (si se pide) y lee del espejo local solo el rango pedido (orden DESC)."""
     user_id = st.session_state["user_id"]
+    if sincronizar:
+        try:
+            store.sincronizar(DB_FILE, user_id)
+        except Exception as e:
+            st.caption(f"⚠️ Mostrando el historial guardado; no se pudo sincronizar: {e}")
     try:
-        data = _get_fichajes(user_id=user_id, limit=limit)
-        df = pd.DataFrame(data)
-
-        if df.empty:
-            return df
+        df = store.leer_fichajes(DB_FILE, empleado=empleado_filtro, user_id=user_id, desde=desde, hasta=hasta)
+        # fecha_local se muestra tal cual; jornada usa el epoch ya calculado (sin parsear textos)
+        return df[["empleado", "fecha_local", "tipo", "observaciones", "fuente", "epoch"]]
+    except Exception as e:
+        st.error(f"No se pudo cargar el historial: {e}")
+        return pd.DataFrame(columns=["empleado", "fecha_local", "tipo", "observaciones", "fuente", "epoch"])
 
-        # Asegurar columnas esperadas por tu UI
-        for col in ["empleado", "fecha_local", "tipo", "observaciones", "fuente"]:
-            if col not in df.columns:
-                df[col] = ""
+def hay_anteriores(antes_de: date, empleado_filtro: str | None = None) -> bool:
+    df = store.leer_fichajes(DB_FILE, empleado=empleado_filtro, user_id=st.session_state["user_id"],
+                             hasta=antes_de - timedelta(days=1), limit=1)
+    return not df.empty
 
-        # Filtro por empleado (si lo usabas)
-        if empleado_filtro:
-            df = df[df["empleado"] == empleado_filtro]
 
-        # Orden descendente como hacías con ORDER BY id DESC
-        df["fecha_local"] = pd.to_datetime(df["fecha_local"])
-        df = df.sort_values("fecha_local", ascending=False).head(limit).reset_index(drop=True)
-
-        # Devolver en el mismo orden de columnas que pintas en la tabla
-        return df[["empleado", "fecha_local", "tipo", "observaciones", "fuente"]]
-    except Exception as e:
-        st.error(f"No se pudo cargar el historial: {e}")
-        return pd.DataFrame(columns=["empleado", "fecha_local", "tipo", "observaciones", "fuente"])
-
-
-# ===== Rotación de QR cada ~48h =====
-# Usamos HMAC-SHA256 sobre un contador de tiempo (epoch // periodo)
-# El secreto debe estar en secrets: QR_SECRET="tu_uuid_super_secreto"
-QR_SECRET = st.secrets.get("QR_SECRET", "cambia_esto_por_un_uuid_largo_y_secreto")
-QR_PREFIX = "FICHAJE:"  # prefijo para reconocer nuestros QR
-QR_PERIOD_HOURS = int(st.secrets.get("QR_PERIOD_HOURS", 48))  # periodo ~2 días
-QR_ALLOWED_SKEW = 1  # aceptamos el periodo actual +/- 1 para tolerar reloj
-
-def _b64url(b: bytes) -> str:
-    return base64.urlsafe_b64encode(b).rstrip(b"=").decode("utf-8")
-
-def _token_for_counter(counter: int) -> str:
-    mac = hmac.new(QR_SECRET.encode("utf-8"), str(counter).encode("utf-8"), hashlib.sha256).digest()
-    return _b64url(mac)[:12]  # 12 caracteres, suficiente y legible
-
-def current_qr_token(at_ts: float | None = None) -> str:
-    if at_ts is None:
-        at_ts = time.time()
-    period = QR_PERIOD_HOURS * 3600
-    counter = int(at_ts // period)
-    return _token_for_counter(counter)
-
-def valid_qr_tokens(at_ts: float | None = None) -> list[str]:
-    if at_ts is None:
-        at_ts = time.time()
-    period = QR_PERIOD_HOURS * 3600
-    counter = int(at_ts // period)
-    tokens = []
-    for c in range(counter - QR_ALLOWED_SKEW, counter + QR_ALLOWED_SKEW + 1):
-        tokens.append(_token_for_counter(c))
-    return tokens
-
-def build_qr_payload(token: str) -> str:
-    return f"{QR_PREFIX}{token}"
-
-def is_qr_payload_valid(payload: str) -> bool:
-    if not payload or not payload.startswith(QR_PREFIX):
-        return False
-    token = payload[len(QR_PREFIX):].strip()
-    return token in valid_qr_tokens()
+# ===== QR rotatorio por sede (cada ~48h) =====
+# Tokens y secretos en qr_tokens (QR_SECRETS por sede, o QR_SECRET como hasta ahora)
 
 # ====== UI ======
 ensure_schema()
+outbox.iniciar_worker(DB_FILE)  # reenvía lo que quedara pendiente tras un reinicio
 
 st.header("Fichaje")
 
@@ -197,17 +137,60 @@ metodo = st.radio("¿Cómo quieres fichar?", ["Geolocalización", "QR"], horizon
 
 permitir_fichaje = False
 motivo_bloqueo = None
+sede_fichaje = None   # id de la sede en la que se ficha; se anota en las observaciones
 fuente_registro = "movil_geo" if metodo == "Geolocalización" else "movil_qr"
 
-if metodo == "Geolocalización":
+def ubicacion_actual() -> dict | None:
+    """
+    Última ubicación de la sesión {lat, lon, precision, ts} si sigue fresca; si no, muestra el
+    componente de geolocalización para pedir otra. Mientras es fresca el componente no se
+    monta, así que escribir observaciones o cambiar de opción no vuelve a pedir el GPS.
+    """
+    fix = st.session_state.get("geo_fix")
+    if fix and time.time() - fix["ts"] < GEO_FRESCURA_S and not st.session_state.get("geo_refrescar"):
+        c1, c2 = st.columns([3, 1])
+        c1.caption(f"Ubicación de hace {int(time.time() - fix['ts'])} s"
+                   + (f" (±{fix['precision']:.0f} m)" if fix.get("precision") else ""))
+        if c2.button("Actualizar", key="geo_actualizar"):
+            st.session_state["geo_refrescar"] = True
+            st.rerun()
+        return fix
+    # El componente se acaba de montar (no estaba en el rerun anterior): lo que devuelva es
+    # una lectura nueva del navegador
     location = streamlit_geolocation()
     if location and location.get("latitude"):
-        user_coords = (location["latitude"], location["longitude"])
-        distancia = geodesic(user_coords, OFFICE_COORD).km
-        st.info(f"Distancia a la oficina: {distancia*1000:.2f} metros")
-        permitir_fichaje = distancia <= DISTANCIA_MAXIMA
+        fix = {"lat": location["latitude"], "lon": location["longitude"],
+               "precision": location.get("accuracy"), "ts": time.time()}
+        st.session_state["geo_fix"] = fix
+        st.session_state.pop("geo_refrescar", None)
+        return fix
+    return None
+
+def comprobar_geocerca(fix: dict) -> geocerca.Resultado:
+    """Resultado de la geocerca para la ubicación; solo se recalcula si cambia la ubicación."""
+    geo = geocerca.get_geocercas()
+    clave = (fix["lat"], fix["lon"], id(geo))
+    previo = st.session_state.get("geo_res")
+    if previo is None or previo[0] != clave:
+        previo = (clave, geo.comprobar(fix["lat"], fix["lon"]))
+        st.session_state["geo_res"] = previo
+    return previo[1]
+
+if metodo == "Geolocalización":
+    fix = ubicacion_actual()
+    if fix:
+        res = comprobar_geocerca(fix)
+        if res.cercana is not None:
+            st.info(f"Distancia a {res.cercana.nombre}: {res.distancia_m:.2f} metros")
+        sede_fichaje = res.sede.id if res.sede is not None else None
+        permitir_fichaje = sede_fichaje is not None
         if not permitir_fichaje:
-            motivo_bloqueo = f"Estás a más de {int(DISTANCIA_MAXIMA*1000)} m de la oficina."
+            if res.cercana is None:
+                motivo_bloqueo = "No hay sedes configuradas para fichar."
+            elif res.cercana.poligono:
+                motivo_bloqueo = f"Estás fuera del recinto de {res.cercana.nombre}."
+            else:
+                motivo_bloqueo = f"Estás a más de {int(res.cercana.radio_m)} m de {res.cercana.nombre}."
     else:
         motivo_bloqueo = "No se pudo obtener tu ubicación. Permite el acceso a la ubicación en tu navegador."
 else:
@@ -225,24 +208,25 @@ else:
     # 2) Intento B (fallback): usar la cámara nativa de Streamlit y decodificar la foto
     if not qr_texto:
         img_file = st.camera_input("Usar cámara del móvil (foto del QR)")
-        if img_file and Image is not None and decode_qr is not None:
+        if img_file and qr_decode.disponible():
             try:
-                img = Image.open(img_file)
-                results = decode_qr(img)
-                if results:
-                    qr_texto = results[0].data.decode("utf-8", errors="ignore")
+                lectura = qr_decode.leer(img_file)
+                if lectura.texto:
+                    qr_texto = lectura.texto
                     st.write(f"QR leído: `{qr_texto}`")
                 else:
                     st.warning("No se detectó ningún QR en la imagen. Acerca un poco más y asegúrate de que esté enfocado.")
             except Exception as e:
                 st.error(f"No se pudo procesar la imagen del QR: {e}")
-        elif img_file and (Image is None or decode_qr is None):
+        elif img_file and not qr_decode.disponible():
             st.error("Falta instalar Pillow/pyzbar para decodificar el QR a partir de la foto.")
 
     # Validación del QR y estado de fichaje
     if qr_texto:
-        if is_qr_payload_valid(qr_texto):
-            st.success("QR válido. Puedes fichar.")
+        sede_fichaje = qr_tokens.validar(qr_texto)
+        if sede_fichaje is not None:
+            sede = geocerca.get_geocercas().por_id(sede_fichaje)
+            st.success(f"QR válido ({sede.nombre if sede else sede_fichaje}). Puedes fichar.")
             permitir_fichaje = True
         else:
             motivo_bloqueo = "QR no válido o caducado."
@@ -256,6 +240,8 @@ else:
 
 # Observaciones
 observaciones = st.text_area("Observaciones (opcional)", placeholder="Escribe un comentario si lo necesitas")
+if sede_fichaje is not None:
+    observaciones = f"[{sede_fichaje}] {observaciones}".strip()
 
 # Botones de fichaje
 c1, c2 = st.columns(2)
@@ -266,8 +252,7 @@ if permitir_fichaje:
                 reg = insertar_fichaje(usuario_log, "Entrada", observaciones, fuente=fuente_registro)
                 fecha_txt = reg.get("fecha_local") or reg.get("fecha_utc") \
                             or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                st.success(f"Entrada registrada — {'fecha_txt'}")
-                st.cache_data.clear()
+                st.success(f"Entrada registrada — {fecha_txt}")
                 
             except Exception as e:
                 st.error(f"Error al registrar la entrada: {e}")
@@ -279,8 +264,7 @@ if permitir_fichaje:
                 reg = insertar_fichaje(usuario_log, "Salida", observaciones, fuente=fuente_registro)
                 fecha_txt = reg.get("fecha_local") or reg.get("fecha_utc") \
                             or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                st.success(f"Salida registrada — {'fecha_txt'}")
-                st.cache_data.clear()
+                st.success(f"Salida registrada — {fecha_txt}")
                 
             except Exception as e:
                 st.error(f"Error al registrar la salida: {e}")
@@ -292,18 +276,63 @@ else:
 
 
 
+# ===== Bandeja de envío =====
+pendientes = outbox.listar(DB_FILE, st.session_state["user_id"])
+if pendientes:
+    st.subheader("Pendientes de enviar")
+    st.caption("Están guardados en el dispositivo y se envían automáticamente; no hace falta volver a fichar.")
+    st.dataframe(pd.DataFrame([{
+        "Fecha y hora": p["fecha_local"],
+        "Tipo de fichaje": p["tipo"],
+        "Estado": "⏳ En cola" if p["estado"] == "pendiente" else "❌ Rechazado",
+        "Intentos": p["intentos"],
+        "Último error": p["ultimo_error"] or "",
+    } for p in pendientes]), use_container_width=True)
+
 # ===== Historial del usuario =====
-st.subheader("Tus últimos fichajes")
-df_hist = cargar_historial(limit=200, empleado_filtro=usuario_log)
-if not df_hist.empty:
-    df_hist = df_hist.rename(columns={
-        "empleado": "Empleado",
-        "fecha_local": "Fecha y hora",
-        "tipo": "Tipo de fichaje",
-        "observaciones": "Observaciones",
-        "fuente": "Método",
-    })
-st.dataframe(df_hist, use_container_width=True)
+# Se muestra una semana cada vez (la actual primero) y se pasa de una a otra sin recargar el
+# resto de la página. Solo se sincroniza con el backend en la ejecución completa de la página;
+# los cambios de semana leen únicamente el espejo local.
+def _cambiar_semana(delta: int):
+    st.session_state["hist_semana"] = max(0, st.session_state.get("hist_semana", 0) + delta)
+    st.session_state["hist_sin_sync"] = True
+    st.rerun(scope="fragment")
+
+@st.fragment
+def historial(empleado: str):
+    st.subheader("Tus últimos fichajes")
+    atras = st.session_state.setdefault("hist_semana", 0)   # semanas antes de la actual
+    sincronizar = not st.session_state.pop("hist_sin_sync", False)
+    hoy = tiempo.ahora_local().date()
+    desde = hoy - timedelta(days=hoy.weekday()) - timedelta(weeks=atras)
+    hasta = min(desde + timedelta(days=6), hoy)
+    df_hist = cargar_historial(desde, hasta, empleado_filtro=empleado, sincronizar=sincronizar)
+    st.caption(f"Semana del {desde.strftime('%d/%m/%Y')} al {(desde + timedelta(days=6)).strftime('%d/%m/%Y')}")
+    if df_hist.empty:
+        st.caption("Sin fichajes esta semana.")
+    else:
+        resumen = jornada.resumen_por_dia(df_hist).sort_values("dia", ascending=False)
+        st.dataframe(pd.DataFrame({
+            "Día": [d.strftime("%d/%m/%Y") for d in resumen["dia"]],
+            "Marcas": [" · ".join(m) if m else "—" for m in resumen["marcas"]],
+            "Horas": resumen["horas"],
+        }), use_container_width=True, hide_index=True)
+        st.caption(f"Total de la semana: {resumen['horas'].sum():.2f} h")
+        st.dataframe(df_hist.drop(columns="epoch").rename(columns={
+            "empleado": "Empleado",
+            "fecha_local": "Fecha y hora",
+            "tipo": "Tipo de fichaje",
+            "observaciones": "Observaciones",
+            "fuente": "Método",
+        }), use_container_width=True, hide_index=True)
+    c1, c2 = st.columns(2)
+    if c1.button("◀ Semana anterior", disabled=not hay_anteriores(desde, empleado_filtro=empleado),
+                 use_container_width=True):
+        _cambiar_semana(1)
+    if c2.button("Semana siguiente ▶", disabled=atras == 0, use_container_width=True):
+        _cambiar_semana(-1)
+
+historial(usuario_log)
 
 
 
@@ -0,0 +1,68 @@
+# pages/paginaKioscoQR.py
+# Pantalla para la tablet de la oficina: muestra el QR rotatorio de la sede.
+# Abrir con ?sede=<id> para fijar la sede sin tocar la pantalla.
+import time
+
+import streamlit as st
+
+import os, sys
+ROOT = os.path.dirname(os.path.dirname(__file__))  # .../app
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+import supabase_login_shim as auth
+import ui_pages as ui
+import geocerca
+import qr_tokens
+from user_directory import get_directorio
+
+st.set_page_config(
+    layout="centered",
+    initial_sidebar_state="collapsed",
+    menu_items={"Get help": None, "Report a bug": None, "About": None}
+)
+
+st.markdown("""
+<style>
+#MainMenu { display: none !important; visibility: hidden !important; }
+div[data-testid="stMainMenu"] { display: none !important; visibility: hidden !important; }
+div[data-testid="stToolbar"] { display: none !important; visibility: hidden !important; }
+</style>
+""", unsafe_allow_html=True)
+
+REFRESCO_S = 30   # el QR se cambia como mucho 30 s después del cambio de periodo (se acepta +/- 1 periodo)
+
+auth.generarLogin(__file__)
+ui.generarMenuRoles(st.session_state["usuario"])
+
+# El QR permite fichar en la sede: solo lo ven admin y la cuenta del kiosco
+_yo = get_directorio().buscar(st.session_state["usuario"])
+if _yo is None or _yo.get("rol") not in ("admin", "kiosco"):
+    st.error("No tienes permiso para ver el QR de fichaje.")
+    st.stop()
+
+sedes = list(qr_tokens.SECRETOS)
+if not sedes:
+    st.error("No hay secretos QR configurados (QR_SECRETS o QR_SECRET).")
+    st.stop()
+
+sede_id = st.query_params.get("sede")
+if sede_id not in sedes:
+    sede_id = st.selectbox("Sede", sedes, format_func=lambda s: getattr(geocerca.get_geocercas().por_id(s), "nombre", s))
+
+
+@st.fragment(run_every=REFRESCO_S)
+def mostrar_qr(sede_id: str):
+    ahora = time.time()
+    counter = qr_tokens.contador(ahora)
+    st.image(qr_tokens.imagen(sede_id, counter), use_column_width=True)
+    qr_tokens.precargar_siguiente(sede_id, ahora)
+
+    periodo_s = qr_tokens.QR_PERIOD_HOURS * 3600
+    restante = int((counter + 1) * periodo_s - ahora)
+    st.caption(f"Cambia en {restante // 3600} h {restante % 3600 // 60} min")
+
+
+sede = geocerca.get_geocercas().por_id(sede_id)
+st.header(f"Fichaje — {sede.nombre if sede else sede_id}")
+st.caption("Escanea este código desde la página de Fichajes de tu móvil.")
+mostrar_qr(sede_id)
@@ -1,7 +1,6 @@
 import os
-import sqlite3
+import hashlib, json
 from datetime import datetime, date, time, timedelta
-import time as _time
 import pandas as pd
 import streamlit as st
 #import login as login
@@ -11,7 +10,15 @@ if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 import supabase_login_shim as auth
 import ui_pages as ui
-from api_client import get_fichajes
+import fichajes_store as store
+import api_cache
+import requests
+from api_client import post_fichajes_manual_lote
+import jornada
+import tiempo
+import exportar_jornada
+import supabase_clients as sbc
+from user_directory import get_directorio
 
 st.set_page_config(
     layout="wide",
@@ -60,95 +67,50 @@ def fecha_corta_es(d, con_anio=False):
     fmt = "%d/%m/%Y" if con_anio else "%d/%m"
     return f"{DIAS_ES[d.weekday()]} {d.strftime(fmt)}"
 
-def get_conn():
-    os.makedirs(os.path.dirname(DB_FILE), exist_ok=True)
-    return sqlite3.connect(DB_FILE)
-
 def ensure_schema():
     # Garantiza que exista la tabla fichajes con el mismo esquema que paginaFichajeMovil
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute(f"""
-            CREATE TABLE IF NOT EXISTS {TABLE} (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                empleado TEXT NOT NULL,
-                fecha_local TEXT NOT NULL,   -- 'YYYY-MM-DD HH:MM:SS' (zona horaria local)
-                fecha_utc   TEXT NOT NULL,   -- 'YYYY-MM-DD HH:MM:SS' (UTC)
-                tipo TEXT NOT NULL CHECK (tipo IN ('Entrada','Salida')),
-                observaciones TEXT,
-                fuente TEXT DEFAULT 'movil',
-                created_at_utc TEXT DEFAULT (datetime('now'))
-            );
-        """)
-        conn.commit()
-
-def _local_to_utc_str(dt_local: datetime) -> str:
-    """Convierte un datetime 'naive' local a cadena UTC 'YYYY-MM-DD HH:MM:SS' sin libs externas."""
-    # offset local = now_local - now_utc (aprox, válido para España con cambio horario)
-    offset = datetime.now() - datetime.utcnow()
-    dt_utc = dt_local - offset
-    return dt_utc.strftime("%Y-%m-%d %H:%M:%S")
-
-def insertar_par_manual(empleado: str, d: date, h_entrada: time, h_salida: time, nota: str = ""):
-    """Inserta un par Entrada/Salida manual para un día."""
-    if h_salida <= h_entrada:
-        raise ValueError("La hora de salida debe ser posterior a la hora de entrada.")
-    dt_e_local = datetime.combine(d, h_entrada)
-    dt_s_local = datetime.combine(d, h_salida)
-    e_local = dt_e_local.strftime("%Y-%m-%d %H:%M:%S")
-    s_local = dt_s_local.strftime("%Y-%m-%d %H:%M:%S")
-    e_utc = _local_to_utc_str(dt_e_local)
-    s_utc = _local_to_utc_str(dt_s_local)
-    obs = (nota or "").strip() or "ajuste manual desde app"
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute(
-            f"INSERT INTO {TABLE}(empleado, fecha_local, fecha_utc, tipo, observaciones, fuente) "
-            f"VALUES (?, ?, ?, 'Entrada', ?, 'ajuste_movil');",
-            (empleado, e_local, e_utc, obs)
-        )
-        cur.execute(
-            f"INSERT INTO {TABLE}(empleado, fecha_local, fecha_utc, tipo, observaciones, fuente) "
-            f"VALUES (?, ?, ?, 'Salida', ?, 'ajuste_movil');",
-            (empleado, s_local, s_utc, obs)
-        )
-        conn.commit()
+    store.ensure_schema(DB_FILE)
+
+def guardar_ajustes(empleado: str, pares: list[dict]) -> dict:
+    """
+    Envía todos los pares Entrada/Salida manuales en una sola petición atómica y guarda en el
+    espejo local los fichajes que devuelve el backend. pares: {"dia", "entrada", "salida", "nota"}.
+    """
+    user_id = st.session_state["user_id"]
+    items = []
+    for i, p in enumerate(pares):
+        # Desfase del propio día (Europe/Madrid), no el de hoy: correcto a ambos lados del cambio de hora
+        items.append({
+            "ref": i,
+            "entrada_local": p["entrada"].strftime(tiempo.FORMATO),
+            "entrada_utc": tiempo.local_a_utc_str(p["entrada"]),
+            "salida_local": p["salida"].strftime(tiempo.FORMATO),
+            "salida_utc": tiempo.local_a_utc_str(p["salida"]),
+            "observaciones": (p.get("nota") or "").strip() or "ajuste manual desde app",
+        })
+    # Misma corrección = misma clave: un doble clic o un reintento no duplica fichajes
+    clave = hashlib.sha256(json.dumps([user_id, items], sort_keys=True).encode("utf-8")).hexdigest()
+    try:
+        res = post_fichajes_manual_lote(user_id, empleado, items, idempotency_key=clave) or {}
+    finally:
+        api_cache.invalidar(user_id, "fichajes")
+    if res.get("ok"):
+        nuevos = [f for r in res.get("results") or [] for f in r.get("fichajes") or []]
+        store.guardar_remotos(DB_FILE, user_id, nuevos, avanzar_marca=False)
+    return res
 
 def cargar_fichajes_semana(empleado: str, d_ini: date, d_fin: date) -> pd.DataFrame:
-    import pandas as pd
     user_id = st.session_state["user_id"]
-    data = get_fichajes(user_id, limit=1000)  # traemos y filtramos
-    df = pd.DataFrame(data)
-    if df.empty: 
-        return df
-    df = df[df["empleado"] == empleado]
-    df["fecha_local"] = pd.to_datetime(df["fecha_local"])
-    mask = (df["fecha_local"].dt.date >= d_ini) & (df["fecha_local"].dt.date <= d_fin)
-    return df.loc[mask, ["id","empleado","fecha_local","tipo","observaciones","fuente"]]
-
-
-
-def _pair_and_sum(day_df: pd.DataFrame) -> tuple[list[str], float]:
-    """Devuelve lista de marcas 'HH:MM - HH:MM' y total de horas (float)."""
-    marcas = []
-    total_seconds = 0
-    # Ordena por fecha_local
-    df = day_df.sort_values("fecha_local").reset_index(drop=True)
-    times = [(row["tipo"], datetime.strptime(row["fecha_local"], "%Y-%m-%d %H:%M:%S")) for _, row in df.iterrows()]
-    i = 0
-    while i < len(times):
-        tipo, t = times[i]
-        if tipo == "Entrada" and i + 1 < len(times) and times[i+1][0] == "Salida":
-            t2 = times[i+1][1]
-            marcas.append(f"{t.strftime('%H:%M')} - {t2.strftime('%H:%M')}")
-            total_seconds += (t2 - t).total_seconds()
-            i += 2
-        else:
-            # marca impar o desordenada
-            marcas.append(f"{t.strftime('%H:%M')} - ?")
-            i += 1
-    total_horas = round(total_seconds / 3600.0, 2)
-    return marcas, total_horas
+    # Delta incremental contra el backend; la semana se lee del espejo local por índice
+    try:
+        store.sincronizar(DB_FILE, user_id)
+    except Exception as e:
+        st.caption(f"⚠️ Mostrando fichajes guardados; no se pudo sincronizar: {e}")
+    df = store.leer_fichajes(DB_FILE, empleado=empleado, desde=d_ini, hasta=d_fin, descendente=False)
+    # fecha_local queda como texto 'YYYY-MM-DD HH:MM:SS', que es lo que espera jornada
+    return df[["id","empleado","fecha_local","tipo","observaciones","fuente","epoch"]]
+
+
 
 def _iso_week_start(d: date) -> date:
     # Lunes de la semana ISO del día d
@@ -170,7 +132,7 @@ if "usuario" not in st.session_state:
 empleado = st.session_state["usuario"]
 
 # Selector de semana (referencia por día)
-hoy = date.today()
+hoy = tiempo.ahora_local().date()
 ref_day = st.date_input("Semana de...", value=hoy)
 semana = _week_dates(ref_day)
 d_ini, d_fin = semana[0], semana[-1]
@@ -180,24 +142,13 @@ st.caption(f"Semana: **{iso_week}** ")
 
 df_sem = cargar_fichajes_semana(empleado, d_ini, d_fin)
 
-if not df_sem.empty:
-    df_sem["fecha_local"] = pd.to_datetime(df_sem["fecha_local"]).dt.strftime("%Y-%m-%d %H:%M:%S")
-else:
-    # Si viene vacío, fuerza dtype de string para que .str no de error
-    df_sem["fecha_local"] = df_sem.get("fecha_local", pd.Series(dtype="string")).astype("string")
-    
-# Construye visión por día
-rows = []
-for d in semana:
-    day_str = d.strftime("%Y-%m-%d")
-    day_df = df_sem[df_sem["fecha_local"].str.startswith(day_str)]
-    marcas, total_h = _pair_and_sum(day_df)
-    rows.append({
-        "fecha": fecha_corta_es(d),
-        "marcas": " · ".join(marcas) if marcas else "—",
-        "horas": total_h
-    })
-df_view = pd.DataFrame(rows)
+# Construye visión por día (toda la semana en una pasada)
+resumen = jornada.resumen_por_dia(df_sem, dias=semana)
+df_view = pd.DataFrame({
+    "fecha": [fecha_corta_es(d) for d in resumen["dia"]],
+    "marcas": [" · ".join(m) if m else "—" for m in resumen["marcas"]],
+    "horas": resumen["horas"],
+})
 # Renombrar las columnas del DataFrame
 df_view = df_view.rename(columns={
     "fecha": "Fecha",
@@ -207,22 +158,115 @@ df_view = df_view.rename(columns={
 
 st.dataframe(df_view, use_container_width=True)
 
+# Totales desde el resumen diario (jornada_dia): cuestan lo mismo para la semana que para el año
+def _horas(desde: date, hasta: date, periodo: str) -> float:
+    t = store.totales(DB_FILE, empleado, desde, hasta, periodo)
+    return float(t["horas"].sum()) if not t.empty else 0.0
+
+ini_mes = ref_day.replace(day=1)
+fin_mes = (ini_mes + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+ini_anio, fin_anio = date(ref_day.year, 1, 1), date(ref_day.year, 12, 31)
+m1, m2, m3 = st.columns(3)
+m1.metric("Horas semana", f"{_horas(d_ini, d_fin, 'semana'):.2f}")
+m2.metric("Horas mes", f"{_horas(ini_mes, fin_mes, 'mes'):.2f}")
+m3.metric(f"Horas {ref_day.year}", f"{_horas(ini_anio, fin_anio, 'anio'):.2f}")
+with st.expander(f"Horas por mes en {ref_day.year}"):
+    st.dataframe(store.totales(DB_FILE, empleado, ini_anio, fin_anio, "mes").rename(columns={
+        "periodo": "Mes", "dias": "Días", "horas": "Horas", "anomalias": "Días con marcas sueltas",
+    }), use_container_width=True, hide_index=True)
+
+# ===== Exportar registro de jornada =====
+with st.expander("Exportar registro de jornada"):
+    directorio = get_directorio()
+    yo = directorio.buscar(empleado) or {}
+    e1, e2 = st.columns(2)
+    rango = e1.date_input("Periodo", value=(ini_mes, min(fin_mes, hoy)), key="exp_rango")
+    formato = e2.radio("Formato", list(exportar_jornada.FORMATOS), horizontal=True, key="exp_formato")
+    emails = [empleado]
+    if yo.get("rol") == "admin":
+        todos = [u.get("email", "").lower() for u in directorio.usuarios if u.get("email")]
+        emails = st.multiselect("Empleados", todos, default=[empleado.lower()], key="exp_empleados")
+    if st.button("Generar", disabled=not (isinstance(rango, tuple) and len(rango) == 2 and emails)):
+        fuentes, sin_id = [], []
+        for em in emails:
+            uid = st.session_state["user_id"] if em == empleado.lower() else sbc.resolver_user_id(em)
+            (fuentes if uid else sin_id).append(uid or em)
+        if sin_id:
+            st.warning("Sin usuario en el sistema: " + ", ".join(sin_id))
+        titulo = (f"{', '.join(emails) if len(emails) <= 3 else f'{len(emails)} empleados'} · "
+                  f"{rango[0].strftime('%d/%m/%Y')} – {rango[1].strftime('%d/%m/%Y')}")
+        try:
+            with st.spinner("Generando…"):
+                ruta = exportar_jornada.exportar(formato, fuentes, rango[0], rango[1], titulo=titulo)
+            with open(ruta, "rb") as f:
+                st.session_state["exp_fichero"] = (f.read(), formato, rango, tuple(emails))
+            os.remove(ruta)
+        except Exception as e:
+            st.error(f"No se pudo generar la exportación: {e}")
+    # El fichero generado solo vale para la selección actual; no se guarda en la sesión más de lo necesario
+    if "exp_fichero" in st.session_state and st.session_state["exp_fichero"][1:] != (formato, rango, tuple(emails)):
+        del st.session_state["exp_fichero"]
+    if "exp_fichero" in st.session_state:
+        datos, fmt, (r0, r1), _ = st.session_state["exp_fichero"]
+        ext, mime = exportar_jornada.FORMATOS[fmt]
+        st.download_button(f"Descargar {fmt}", datos, mime=mime,
+                           file_name=f"registro_jornada_{r0.isoformat()}_{r1.isoformat()}.{ext}",
+                           on_click=lambda: st.session_state.pop("exp_fichero", None))
+
 st.markdown("---")
 st.subheader("Añadir fichaje")
 
-col1, col2, col3 = st.columns([2,1,1])
-with col1:
-    dia_sel = st.selectbox("Día", options=semana, format_func=lambda d: fecha_corta_es(d, con_anio=True))
-with col2:
-    h_in = st.time_input("Entrada", value=time(9, 0))
-with col3:
-    h_out = st.time_input("Salida", value=time(17, 0))
-
-nota = st.text_input("Motivo / observación (opcional)")
+# Varios pares Entrada/Salida de la semana; se validan contra lo cargado y se envían juntos
+etiquetas = {fecha_corta_es(d, con_anio=True): d for d in semana}
+editados = st.data_editor(
+    pd.DataFrame([{"Día": fecha_corta_es(min(hoy, d_fin), con_anio=True), "Entrada": time(9, 0),
+                   "Salida": time(17, 0), "Motivo": ""}]),
+    num_rows="dynamic", use_container_width=True, hide_index=True, key=f"ajustes_{iso_year}_{iso_week}",
+    column_config={
+        "Día": st.column_config.SelectboxColumn("Día", options=list(etiquetas), required=True),
+        "Entrada": st.column_config.TimeColumn("Entrada", format="HH:mm", required=True),
+        "Salida": st.column_config.TimeColumn("Salida", format="HH:mm", required=True),
+        "Motivo": st.column_config.TextColumn("Motivo / observación (opcional)"),
+    },
+)
 
-# donde está el botón "Guardar par Entrada/Salida"
-if st.button("Guardar par Entrada/Salida", type="primary", disabled=True):
-    st.info("El guardado manual se habilitará cuando añadamos el endpoint /fichajes/manual en el backend.")
+# El aviso de guardado se muestra tras el rerun que recarga la semana
+if (aviso := st.session_state.pop("ajustes_guardados", None)):
+    st.success(aviso)
+
+if st.button("Guardar ajustes", type="primary"):
+    pares = [{"dia": etiquetas[r["Día"]],
+              "entrada": datetime.combine(etiquetas[r["Día"]], r["Entrada"]),
+              "salida": datetime.combine(etiquetas[r["Día"]], r["Salida"]),
+              "nota": r["Motivo"] or ""}
+             for r in editados.to_dict("records")
+             if r.get("Día") in etiquetas and pd.notna(r.get("Entrada")) and pd.notna(r.get("Salida"))]
+    errores = jornada.validar_pares(pares, df_sem)
+    if not pares:
+        st.warning("No hay ningún par completo que guardar.")
+    elif errores:
+        for i, motivo in errores.items():
+            st.error(f"Fila {i + 1}: {motivo}")
+    else:
+        try:
+            res = guardar_ajustes(empleado, pares)
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code in (404, 405):
+                st.info("El guardado manual se habilitará cuando el backend tenga /fichajes/manual/lote.")
+            else:
+                st.error(f"No se pudieron guardar los ajustes: {e}")
+        except Exception as e:
+            st.error(f"No se pudieron guardar los ajustes: {e}")
+        else:
+            if res.get("ok"):
+                st.session_state["ajustes_guardados"] = f"{len(pares)} ajuste(s) guardado(s)."
+                st.rerun()
+            # Atómico: si uno falla no se guarda ninguno; se indica cuál
+            for r in res.get("results") or []:
+                if not r.get("ok"):
+                    st.error(f"Fila {int(r.get('ref', 0)) + 1}: {r.get('error') or 'rechazado'}")
+            if not res.get("results"):
+                st.error("El backend rechazó los ajustes.")
 
 
 
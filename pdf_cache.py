@@ -0,0 +1,136 @@
+# pdf_cache.py
+# Caché local de los PDF de DOCS direccionada por contenido (sha256), revalidada con ETag/Last-Modified.
+# Guarda también la geometría de la última página para estampar sin volver a analizar el PDF.
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+import fitz  # PyMuPDF
+
+from api_client import get_session
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.getenv("PDF_CACHE_DIR") or os.path.join(BASE_DIR, "data", "pdf_cache")
+REVALIDAR_CADA_S = int(os.getenv("PDF_CACHE_REVALIDAR_S") or 300)
+TIMEOUT = (3.05, 20)
+
+
+@dataclass(frozen=True)
+class PdfCacheado:
+    url: str
+    sha256: str
+    ruta: str                     # fichero en disco (<sha256>.pdf)
+    last_rect: tuple              # (x0, y0, x1, y1) de la última página
+    page_count: int
+
+    def leer(self) -> bytes:
+        with open(self.ruta, "rb") as f:
+            return f.read()
+
+
+_lock = threading.Lock()
+_url_locks: dict[str, threading.Lock] = {}
+_mem: dict[str, dict] = {}        # url -> entrada del índice (+ "checked" monotónico)
+
+
+def _ruta_blob(sha: str) -> str:
+    return os.path.join(CACHE_DIR, f"{sha}.pdf")
+
+def _ruta_indice(url: str) -> str:
+    return os.path.join(CACHE_DIR, "index", hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json")
+
+def _escribir_atomico(ruta: str, data: bytes):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    tmp = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, ruta)
+
+def _leer_indice(url: str) -> dict | None:
+    try:
+        with open(_ruta_indice(url), encoding="utf-8") as f:
+            ent = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return ent if os.path.exists(_ruta_blob(ent.get("sha256", ""))) else None
+
+def _geometria(pdf_bytes: bytes) -> tuple[tuple, int]:
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        r = doc[-1].rect
+        return (r.x0, r.y0, r.x1, r.y1), doc.page_count
+
+def _a_resultado(ent: dict) -> PdfCacheado:
+    return PdfCacheado(ent["url"], ent["sha256"], _ruta_blob(ent["sha256"]),
+                       tuple(ent["last_rect"]), int(ent["page_count"]))
+
+def _revalidar(url: str, ent: dict | None) -> dict:
+    headers = {}
+    if ent:
+        if ent.get("etag"):
+            headers["If-None-Match"] = ent["etag"]
+        if ent.get("last_modified"):
+            headers["If-Modified-Since"] = ent["last_modified"]
+    resp = get_session().get(url, headers=headers, timeout=TIMEOUT)
+    if resp.status_code == 304 and ent:
+        return ent
+    resp.raise_for_status()
+    data = resp.content
+    sha = hashlib.sha256(data).hexdigest()
+    if ent and ent["sha256"] == sha:
+        nuevo = dict(ent)   # mismo contenido: la geometría sigue valiendo
+        nuevo.pop("checked", None)
+    else:
+        if not os.path.exists(_ruta_blob(sha)):
+            _escribir_atomico(_ruta_blob(sha), data)
+        rect, n = _geometria(data)
+        nuevo = {"url": url, "sha256": sha, "last_rect": list(rect), "page_count": n}
+    nuevo["etag"] = resp.headers.get("ETag")
+    nuevo["last_modified"] = resp.headers.get("Last-Modified")
+    _escribir_atomico(_ruta_indice(url), json.dumps(nuevo).encode("utf-8"))
+    return nuevo
+
+def obtener(url: str, max_age_s: int = REVALIDAR_CADA_S) -> PdfCacheado:
+    """
+    PDF de la URL desde la caché. Si la última comprobación tiene más de max_age_s,
+    revalida con una petición condicional (304 = sin descarga). Un solo hilo por URL
+    va a la red; si falla y hay copia local, se sirve la copia.
+    """
+    ent = _mem.get(url)
+    if ent and time.monotonic() - ent["checked"] < max_age_s:
+        return _a_resultado(ent)
+    with _lock:
+        url_lock = _url_locks.setdefault(url, threading.Lock())
+    with url_lock:
+        ent = _mem.get(url)
+        if ent and time.monotonic() - ent["checked"] < max_age_s:
+            return _a_resultado(ent)
+        previo = ent or _leer_indice(url)
+        try:
+            ent = _revalidar(url, previo)
+        except Exception:
+            if previo is None:
+                raise
+            ent = previo   # red caída: seguimos con la copia local
+        ent = {**ent, "checked": time.monotonic()}
+        _mem[url] = ent
+        return _a_resultado(ent)
+
+
+_precalentado = threading.Event()
+
+def precalentar(urls: list[str]):
+    """Descarga/revalida en segundo plano los PDF indicados (una vez por proceso)."""
+    if _precalentado.is_set():
+        return
+    _precalentado.set()
+
+    def _run():
+        for u in urls:
+            try:
+                obtener(u, max_age_s=0)
+            except Exception:
+                pass
+    threading.Thread(target=_run, name="pdf-cache-warmup", daemon=True).start()
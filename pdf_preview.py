@@ -0,0 +1,113 @@
+# pdf_preview.py
+# Vista previa de los PDF de DOCS renderizada en el servidor, página a página y bajo demanda.
+# Las imágenes se guardan en un LRU acotado por bytes con clave (sha256 del PDF, página, ancho),
+# así que los siguientes lectores del mismo documento no vuelven a renderizar.
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import fitz  # PyMuPDF
+
+import pdf_cache
+
+CACHE_MAX_BYTES = int(os.getenv("PREVIEW_CACHE_MB") or 64) * 1024 * 1024
+JPG_CALIDAD = 80
+ANCHO = 720   # px; único ancho renderizado, st.image lo escala a la columna en el cliente
+
+_lock = threading.Lock()
+_imgs: "OrderedDict[tuple, bytes]" = OrderedDict()
+_bytes = 0
+_stats = {"hits": 0, "misses": 0, "expulsadas": 0}
+_docs: "OrderedDict[str, _Abierto]" = OrderedDict()   # PDFs abiertos
+DOCS_ABIERTOS_MAX = 8
+_precarga = ThreadPoolExecutor(max_workers=2, thread_name_prefix="preview")
+
+
+class _Abierto:
+    """fitz.Document abierto con su lock y cuántos hilos lo están usando."""
+    __slots__ = ("doc", "lock", "usos", "expulsado")
+
+    def __init__(self, ruta: str):
+        self.doc = fitz.open(ruta)
+        self.lock = threading.Lock()
+        self.usos = 0
+        self.expulsado = False
+
+@contextmanager
+def _doc(original):
+    """Documento abierto en exclusiva. Uno expulsado del LRU lo cierra el último que lo suelta."""
+    cerrar = []
+    with _lock:
+        ent = _docs.get(original.sha256)
+        if ent is None:
+            ent = _docs[original.sha256] = _Abierto(original.ruta)
+        _docs.move_to_end(original.sha256)
+        ent.usos += 1
+        while len(_docs) > DOCS_ABIERTOS_MAX:
+            viejo = _docs.popitem(last=False)[1]
+            viejo.expulsado = True
+            if viejo.usos == 0:
+                cerrar.append(viejo)
+    for viejo in cerrar:
+        viejo.doc.close()
+    try:
+        with ent.lock:   # un fitz.Document no se debe usar desde dos hilos a la vez
+            yield ent.doc
+    finally:
+        with _lock:
+            ent.usos -= 1
+            ultimo = ent.expulsado and ent.usos == 0
+        if ultimo:
+            ent.doc.close()
+
+def _guardar(clave: tuple, img: bytes):
+    global _bytes
+    with _lock:
+        if clave in _imgs:
+            return
+        _imgs[clave] = img
+        _bytes += len(img)
+        while _bytes > CACHE_MAX_BYTES and len(_imgs) > 1:
+            _, viejo = _imgs.popitem(last=False)
+            _bytes -= len(viejo)
+            _stats["expulsadas"] += 1
+
+def num_paginas(url: str) -> int:
+    return pdf_cache.obtener(url).page_count
+
+def pagina(url: str, n: int, ancho: int = ANCHO) -> bytes:
+    """JPEG de la página n (0-based) escalada a 'ancho' píxeles."""
+    original = pdf_cache.obtener(url)
+    clave = (original.sha256, n, ancho)
+    with _lock:
+        img = _imgs.get(clave)
+        if img is not None:
+            _imgs.move_to_end(clave)
+            _stats["hits"] += 1
+            return img
+        _stats["misses"] += 1
+    with _doc(original) as doc:
+        page = doc[n]
+        zoom = ancho / page.rect.width
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        img = pix.tobytes("jpeg", jpg_quality=JPG_CALIDAD)
+    _guardar(clave, img)
+    return img
+
+def precargar(url: str, n: int, ancho: int = ANCHO):
+    """Renderiza en segundo plano la página n si existe (la siguiente que se va a ver)."""
+    def _run():
+        try:
+            if n < num_paginas(url):
+                pagina(url, n, ancho)
+        except Exception:
+            pass
+    _precarga.submit(_run)
+
+def stats() -> dict:
+    with _lock:
+        total = _stats["hits"] + _stats["misses"]
+        return {**_stats, "imagenes": len(_imgs), "bytes": _bytes,
+                "hit_ratio": round(_stats["hits"] / total, 3) if total else 0.0}
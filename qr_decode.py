@@ -0,0 +1,85 @@
+# qr_decode.py
+# Lectura de QR a partir de una foto (st.camera_input) sin pasar los 12 MP a zbar.
+#
+# La foto se abre ya reducida (draft de JPEG) en escala de grises y se prueban, por orden,
+# recortes y escalas hasta el primer acierto:
+#   centro (donde suele estar el QR) -> foto entera -> escalas alternativas -> binarizada.
+# Cada intento cuesta unos ms; la foto completa original nunca se decodifica.
+from dataclasses import dataclass
+
+try:
+    from PIL import Image, ImageOps
+    from pyzbar.pyzbar import ZBarSymbol, decode as _zbar  # type: ignore
+except Exception:
+    Image = ImageOps = ZBarSymbol = _zbar = None
+
+LADO_OBJETIVO = 1024            # px del lado mayor para el primer intento
+ESCALAS = (0.6, 1.5)            # reintentos respecto a LADO_OBJETIVO (QR lejano / QR pequeño)
+ROI_CENTRO = 0.6                # fracción central de la foto
+
+
+@dataclass(frozen=True)
+class Lectura:
+    texto: str | None
+    intento: str | None         # qué paso lo encontró (para métricas y el benchmark)
+    intentos: int
+
+
+def disponible() -> bool:
+    return _zbar is not None
+
+def _cargar(fuente) -> "Image.Image":
+    img = Image.open(fuente)
+    # En JPEG, draft decodifica directamente a 1/2, 1/4 u 1/8: mucho más rápido que reducir después
+    w, h = img.size
+    f = LADO_OBJETIVO * max(ESCALAS) / max(w, h)
+    if f < 1:
+        img.draft("L", (int(w * f), int(h * f)))
+    img = ImageOps.exif_transpose(img)
+    return img.convert("L")
+
+def _a_lado(img, lado: int):
+    w, h = img.size
+    f = lado / max(w, h)
+    if f >= 1:
+        return img
+    return img.resize((max(1, int(w * f)), max(1, int(h * f))), Image.BILINEAR)
+
+def _centro(img):
+    w, h = img.size
+    mx, my = int(w * (1 - ROI_CENTRO) / 2), int(h * (1 - ROI_CENTRO) / 2)
+    return img.crop((mx, my, w - mx, h - my))
+
+def _binarizar(img):
+    # Autocontraste + umbral: ayuda con reflejos y poca luz
+    img = ImageOps.autocontrast(img, cutoff=2)
+    return img.point(lambda p: 255 if p > 128 else 0)
+
+def _intentos(img):
+    base = _a_lado(img, LADO_OBJETIVO)
+    yield "centro", _centro(base)
+    yield "completa", base
+    for e in ESCALAS:
+        yield f"escala {e}", _a_lado(img, int(LADO_OBJETIVO * e))
+    yield "binarizada centro", _binarizar(_centro(base))
+    yield "binarizada", _binarizar(base)
+
+def leer(fuente, decoder=None) -> Lectura:
+    """
+    Decodifica el primer QR de la foto (fichero, ruta o BytesIO). decoder(img) -> list de
+    resultados con .data; por defecto pyzbar limitado a QR.
+    """
+    if decoder is None:
+        decoder = lambda im: _zbar(im, symbols=[ZBarSymbol.QRCODE])
+    img = _cargar(fuente)
+    n = 0
+    vistos = set()
+    for nombre, im in _intentos(img):
+        if im.size in vistos and not nombre.startswith("binarizada"):
+            continue   # p. ej. escala 1.5 de una foto que ya era pequeña
+        vistos.add(im.size)
+        n += 1
+        res = decoder(im)
+        if res:
+            return Lectura(res[0].data.decode("utf-8", errors="ignore"), nombre, n)
+    return Lectura(None, None, n)
@@ -0,0 +1,115 @@
+# qr_tokens.py
+# Tokens QR rotatorios (HMAC-SHA256 sobre epoch // periodo), uno por sede.
+#
+# Secretos en secrets: QR_SECRETS = {sede_id = "secreto", ...}. Si no existe, se usa QR_SECRET
+# para la sede QR_SEDE (por defecto "oficina"), que genera los mismos códigos que antes.
+# Los tokens válidos (periodo actual +/- QR_ALLOWED_SKEW de todas las sedes) se calculan una
+# vez por periodo y se guardan en una tabla token -> sede; validar no vuelve a calcular HMAC.
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+
+import streamlit as st
+
+QR_PREFIX = "FICHAJE:"  # prefijo para reconocer nuestros QR
+QR_ALLOWED_SKEW = 1     # aceptamos el periodo actual +/- 1 para tolerar reloj
+TOKEN_LEN = 12          # 12 caracteres, suficiente y legible
+ESCANEO_HASTA = 8       # hasta este nº de sedes se comparan todos los tokens sin atajos
+
+
+def _secret(nombre: str, defecto=None):
+    return os.getenv(nombre) or st.secrets.get(nombre, defecto)
+
+def _secretos() -> dict[str, str]:
+    multi = st.secrets.get("QR_SECRETS")
+    if multi:
+        return {str(k): str(v) for k, v in dict(multi).items()}
+    return {_secret("QR_SEDE", "oficina"): _secret("QR_SECRET", "cambia_esto_por_un_uuid_largo_y_secreto")}
+
+QR_PERIOD_HOURS = int(_secret("QR_PERIOD_HOURS", 48))  # periodo ~2 días
+SECRETOS = _secretos()
+
+
+def _b64url(b: bytes) -> str:
+    return base64.urlsafe_b64encode(b).rstrip(b"=").decode("utf-8")
+
+def contador(at_ts: float | None = None) -> int:
+    return int((time.time() if at_ts is None else at_ts) // (QR_PERIOD_HOURS * 3600))
+
+def token(sede_id: str, counter: int) -> str:
+    mac = hmac.new(SECRETOS[sede_id].encode("utf-8"), str(counter).encode("utf-8"), hashlib.sha256).digest()
+    return _b64url(mac)[:TOKEN_LEN]
+
+
+_lock = threading.Lock()
+_ventana: dict = {"contador": None, "tabla": {}}   # tabla: token -> (sede_id, contador del token)
+
+def ventana(at_ts: float | None = None) -> dict[str, tuple[str, int]]:
+    """Tokens aceptados ahora -> (sede, contador). Se recalcula solo al cambiar de periodo."""
+    c = contador(at_ts)
+    if _ventana["contador"] != c:
+        with _lock:
+            if _ventana["contador"] != c:
+                _ventana["tabla"] = {token(s, k): (s, k)
+                                     for s in SECRETOS
+                                     for k in range(c - QR_ALLOWED_SKEW, c + QR_ALLOWED_SKEW + 1)}
+                _ventana["contador"] = c
+    return _ventana["tabla"]
+
+def payload(sede_id: str, at_ts: float | None = None) -> str:
+    """Texto del QR de la sede para el periodo de at_ts (ahora por defecto)."""
+    return f"{QR_PREFIX}{token(sede_id, contador(at_ts))}"
+
+def validar(texto: str, at_ts: float | None = None) -> str | None:
+    """Sede a la que pertenece el QR si es válido en la ventana actual; None si no."""
+    if not texto or not texto.startswith(QR_PREFIX):
+        return None
+    tok = texto[len(QR_PREFIX):].strip()
+    tabla = ventana(at_ts)
+    if len(SECRETOS) <= ESCANEO_HASTA:
+        # Pocas sedes: comparación en tiempo constante contra todos, sin salir al primer acierto
+        tok_b = tok.encode("utf-8")
+        sede = None
+        for t, (s, _) in tabla.items():
+            if hmac.compare_digest(t.encode("utf-8"), tok_b):
+                sede = s
+        return sede
+    # Muchas sedes: búsqueda por hash en la tabla; el tiempo no depende del prefijo acertado
+    ent = tabla.get(tok)
+    return ent[0] if ent else None
+
+
+# ===== Imágenes para el kiosco =====
+# PNG por (sede, contador): se renderiza una vez por periodo y el siguiente se prepara antes
+# del cambio, así los refrescos del kiosco solo leen del diccionario.
+_pngs: dict[tuple, bytes] = {}
+
+def _render(texto: str) -> bytes:
+    import io
+    import qrcode
+
+    img = qrcode.make(texto, error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=12, border=2)
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+def imagen(sede_id: str, counter: int) -> bytes:
+    """PNG del QR de la sede para el contador dado (cacheado)."""
+    clave = (sede_id, counter)
+    png = _pngs.get(clave)
+    if png is None:
+        png = _render(f"{QR_PREFIX}{token(sede_id, counter)}")
+        with _lock:
+            _pngs[clave] = png
+            for k in [k for k in _pngs if k[1] < counter - 1]:   # periodos ya pasados
+                del _pngs[k]
+    return png
+
+def precargar_siguiente(sede_id: str, at_ts: float | None = None):
+    """Renderiza en segundo plano el QR del próximo periodo si aún no está."""
+    siguiente = contador(at_ts) + 1
+    if (sede_id, siguiente) not in _pngs:
+        threading.Thread(target=imagen, args=(sede_id, siguiente), daemon=True).start()
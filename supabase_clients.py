@@ -0,0 +1,106 @@
+# supabase_clients.py
+# Clientes de Supabase reutilizados por todo el proceso y caché email -> user_id con TTL.
+import os
+import threading
+import time
+
+import streamlit as st
+from supabase import create_client
+
+IDENTIDAD_TTL_S = int(os.getenv("SUPABASE_ID_TTL") or 3600)
+IDENTIDAD_NEG_TTL_S = 60     # emails no encontrados: reintentar pronto (altas nuevas)
+USERS_PER_PAGE = 1000
+
+_lock = threading.Lock()
+_clientes: dict = {}
+
+
+def _secret(*nombres):
+    for n in nombres:
+        v = os.getenv(n) or st.secrets.get(n)
+        if v:
+            return v
+    return None
+
+def get_client():
+    """Cliente con la anon key (VITE_SUPABASE_ANON_KEY o SUPABASE_ANON_KEY)."""
+    if "anon" not in _clientes:
+        with _lock:
+            if "anon" not in _clientes:
+                _clientes["anon"] = create_client(
+                    _secret("SUPABASE_URL"), _secret("VITE_SUPABASE_ANON_KEY", "SUPABASE_ANON_KEY")
+                )
+    return _clientes["anon"]
+
+def get_admin_client():
+    """Cliente con service role, o None si no está configurado."""
+    if "admin" not in _clientes:
+        with _lock:
+            if "admin" not in _clientes:
+                sr = _secret("SUPABASE_SERVICE_ROLE")
+                _clientes["admin"] = create_client(_secret("SUPABASE_URL"), sr) if sr else None
+    return _clientes["admin"]
+
+
+# ---------- Identidad ----------
+_ids: dict[str, tuple[float, str | None]] = {}   # email -> (expira, user_id | None)
+_ids_lock = threading.Lock()
+_listado_lock = threading.Lock()   # un solo listado completo a la vez (evita estampida)
+
+def _campo(u, nombre):
+    return u.get(nombre) if isinstance(u, dict) else getattr(u, nombre, None)
+
+def _cargar_todos(admin) -> int:
+    """Pagina admin.list_users hasta el final y rellena la caché para todos los usuarios."""
+    expira = time.monotonic() + IDENTIDAD_TTL_S
+    n, pagina = 0, 1
+    while True:
+        res = admin.auth.admin.list_users(page=pagina, per_page=USERS_PER_PAGE)
+        users = res.get("users") if isinstance(res, dict) else getattr(res, "users", res)
+        users = list(users or [])
+        with _ids_lock:
+            for u in users:
+                email = (_campo(u, "email") or "").strip().lower()
+                if email:
+                    _ids[email] = (expira, _campo(u, "id"))
+        n += len(users)
+        if len(users) < USERS_PER_PAGE:
+            return n
+        pagina += 1
+
+def _en_cache(email: str):
+    hit = _ids.get(email)
+    if hit and hit[0] > time.monotonic():
+        return True, hit[1]
+    return False, None
+
+def resolver_user_id(email: str) -> str | None:
+    """
+    user_id de Supabase Auth para un email. Usa la caché; si falla, lista los usuarios
+    (paginando) una sola vez para todos los que esperan. Devuelve None si no existe o no hay service role.
+    """
+    email = (email or "").strip().lower()
+    if not email:
+        return None
+    ok, uid = _en_cache(email)
+    if ok:
+        return uid
+    admin = get_admin_client()
+    if admin is None:
+        return None
+    with _listado_lock:
+        ok, uid = _en_cache(email)   # otro hilo pudo rellenarla mientras esperábamos
+        if ok:
+            return uid
+        _cargar_todos(admin)
+        ok, uid = _en_cache(email)
+        if not ok:
+            with _ids_lock:
+                _ids[email] = (time.monotonic() + IDENTIDAD_NEG_TTL_S, None)
+        return uid
+
+def recordar_user_id(email: str, user_id: str):
+    """Guarda en caché una identidad ya conocida (p. ej. la del login)."""
+    if email and user_id:
+        with _ids_lock:
+            _ids[email.strip().lower()] = (time.monotonic() + IDENTIDAD_TTL_S, user_id)
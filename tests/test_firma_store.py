@@ -0,0 +1,125 @@
+# tests/test_firma_store.py
+# persistir_firma contra un cliente Supabase falso: reintentos, limpieza y comprobación del registro.
+import os, sys
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import pytest
+
+import firma_store
+
+DOC = {"id": "d1", "title": "Contrato"}
+PDF = b"%PDF-1.7 firmado"
+
+
+class _Resp:
+    def __init__(self, data=None):
+        self.data = data
+
+
+class FakeBucket:
+    def __init__(self, fallos_upload=0):
+        self.objetos = {}
+        self.fallos_upload = fallos_upload
+        self.subidas = 0
+        self.borrados = []
+
+    def upload(self, path, data, opciones):
+        self.subidas += 1
+        if self.fallos_upload:
+            self.fallos_upload -= 1
+            raise ConnectionError("timeout subiendo")
+        self.objetos[path] = data
+
+    def remove(self, paths):
+        self.borrados.extend(paths)
+        for p in paths:
+            self.objetos.pop(p, None)
+
+
+class FakeTabla:
+    """upsert(...).execute() y select(...).eq(...).eq(...).execute() sobre una lista de filas."""
+
+    def __init__(self, sb):
+        self.sb = sb
+        self.filtros = {}
+        self.accion = None
+
+    def upsert(self, fila, on_conflict=None):
+        self.accion, self.fila = "upsert", fila
+        return self
+
+    def select(self, columnas):
+        self.accion = "select"
+        return self
+
+    def eq(self, col, valor):
+        self.filtros[col] = valor
+        return self
+
+    def execute(self):
+        if self.accion == "upsert":
+            if self.sb.upsert_llega:
+                self.sb.filas.append(self.fila)
+            if self.sb.upsert_falla:
+                raise ConnectionError("respuesta perdida")
+            return _Resp([self.fila])
+        if self.sb.select_falla:
+            raise ConnectionError("sin red")
+        return _Resp([f for f in self.sb.filas
+                      if all(f.get(k) == v for k, v in self.filtros.items())])
+
+
+class FakeSupabase:
+    def __init__(self, fallos_upload=0, upsert_falla=False, upsert_llega=True, select_falla=False):
+        self.bucket = FakeBucket(fallos_upload)
+        self.filas = []
+        self.upsert_falla = upsert_falla
+        self.upsert_llega = upsert_llega
+        self.select_falla = select_falla
+        self.storage = self
+
+    def from_(self, nombre):
+        assert nombre == firma_store.BUCKET
+        return self.bucket
+
+    def table(self, nombre):
+        assert nombre == firma_store.TABLA
+        return FakeTabla(self)
+
+
+@pytest.fixture(autouse=True)
+def _sin_espera(monkeypatch):
+    monkeypatch.setattr(firma_store, "BACKOFF_S", 0)
+
+
+def test_subida_reintentada():
+    sb = FakeSupabase(fallos_upload=2)
+    path = firma_store.persistir_firma(sb, "u1", DOC, PDF)
+    assert sb.bucket.subidas == 3
+    assert sb.bucket.objetos[path] == PDF
+    assert [f["signed_url"] for f in sb.filas] == [path]
+
+
+def test_error_en_upsert_borra_el_objeto():
+    sb = FakeSupabase(upsert_falla=True, upsert_llega=False)
+    with pytest.raises(ConnectionError, match="respuesta perdida"):
+        firma_store.persistir_firma(sb, "u1", DOC, PDF)
+    assert sb.bucket.objetos == {}
+    assert len(sb.bucket.borrados) == 1
+
+
+def test_error_en_upsert_pero_la_fila_llego():
+    sb = FakeSupabase(upsert_falla=True, upsert_llega=True)
+    path = firma_store.persistir_firma(sb, "u1", DOC, PDF)
+    assert sb.bucket.objetos[path] == PDF
+    assert sb.bucket.borrados == []
+
+
+def test_error_en_upsert_y_en_la_comprobacion():
+    sb = FakeSupabase(upsert_falla=True, upsert_llega=False, select_falla=True)
+    with pytest.raises(ConnectionError, match="respuesta perdida"):
+        firma_store.persistir_firma(sb, "u1", DOC, PDF)
+    assert sb.bucket.borrados == []          # se conserva: podría estar referenciado
+    assert len(sb.bucket.objetos) == 1
@@ -0,0 +1,64 @@
+# tiempo.py
+# Conversión hora local (Europe/Madrid) <-> UTC <-> epoch, correcta en los cambios de horario.
+# Las funciones de serie trabajan sobre columnas enteras (pandas) en lugar de fila a fila.
+#
+# Hora local ambigua (la hora repetida de octubre): se toma la primera, la de verano (fold=0).
+# Hora local inexistente (el salto de marzo): se lee con el desfase de antes del salto
+# (02:30 -> 03:30), que es lo que hace zoneinfo con fold=0.
+import os
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+ZONA = ZoneInfo(os.getenv("ZONA_HORARIA") or "Europe/Madrid")
+FORMATO = "%Y-%m-%d %H:%M:%S"
+_EPOCH = pd.Timestamp(0, tz="UTC")
+_SEGUNDO = pd.Timedelta(seconds=1)
+
+
+# ---------- Valores sueltos ----------
+def local_a_utc(dt_local: datetime) -> datetime:
+    """datetime local 'naive' -> datetime UTC 'aware'."""
+    return dt_local.replace(tzinfo=ZONA).astimezone(timezone.utc)
+
+def local_a_utc_str(dt_local: datetime) -> str:
+    return local_a_utc(dt_local).strftime(FORMATO)
+
+def ahora_local() -> datetime:
+    """Hora local de la empresa ('naive'), independiente de la zona del servidor."""
+    return datetime.now(ZONA).replace(tzinfo=None)
+
+
+# ---------- Columnas ----------
+def _localizar(s: pd.Series) -> pd.Series:
+    # ambiguous=True -> horario de verano (primera ocurrencia), igual que fold=0
+    return s.dt.tz_localize(ZONA, ambiguous=np.ones(len(s), dtype=bool), nonexistent=pd.Timedelta(hours=1))
+
+def local_a_epoch(s: pd.Series) -> np.ndarray:
+    """Textos locales 'YYYY-MM-DD HH:MM:SS' -> segundos epoch (int64)."""
+    t = _localizar(pd.to_datetime(s, format=FORMATO))
+    return ((t - _EPOCH) // _SEGUNDO).to_numpy(dtype="int64")
+
+def utc_a_epoch(s: pd.Series) -> np.ndarray:
+    """Textos UTC 'YYYY-MM-DD HH:MM:SS' -> segundos epoch (int64)."""
+    t = pd.to_datetime(s, format=FORMATO, utc=True)
+    return ((t - _EPOCH) // _SEGUNDO).to_numpy(dtype="int64")
+
+def fichaje_a_epoch(utc: pd.Series, local: pd.Series) -> np.ndarray:
+    """Epoch de fichajes desde fecha_utc (el instante que guarda el backend); fecha_local solo donde falta."""
+    utc = utc.fillna("").astype(str).reset_index(drop=True)
+    local = local.reset_index(drop=True)
+    con_utc = (utc.str.len() == len("YYYY-MM-DD HH:MM:SS")).to_numpy()
+    out = np.empty(len(utc), dtype="int64")
+    if con_utc.any():
+        out[con_utc] = utc_a_epoch(utc[con_utc])
+    if not con_utc.all():
+        out[~con_utc] = local_a_epoch(local[~con_utc])
+    return out
+
+def epoch_a_local(epoch) -> pd.Series:
+    """Segundos epoch -> datetime64 local 'naive' (hora de pared en ZONA)."""
+    t = pd.to_datetime(pd.Series(np.asarray(epoch, dtype="int64")), unit="s", utc=True)
+    return t.dt.tz_convert(ZONA).dt.tz_localize(None)
@@ -1,7 +1,7 @@
-import os
 import streamlit as st
-import pandas as pd
 from datetime import datetime
+from user_directory import get_directorio
+import notificaciones_store as notif
 #from streamlit_cookies_controller import CookieController 
 try:
     from streamlit_cookies_controller import CookieController
@@ -56,29 +56,16 @@ def _saludo(hora: int) -> str:
     if 13 <= hora < 20: return "¡Buenas tardes"
     return "¡Buenas noches"
 
-def _leer_notificaciones(usuario: str) -> pd.DataFrame:
+def _leer_notificaciones(usuario: str) -> list[dict]:
     """
-    Lee notificaciones desde un CSV sencillo:
-    columnas: usuario,titulo,fecha,leido (0/1)
+    Notificaciones pendientes del usuario (SQLite indexado por usuario/leido;
+    las filas nuevas de notificaciones.csv se importan en notificaciones_store).
     """
-    try:
-        df = pd.read_csv("notificaciones.csv")
-        if "leido" not in df.columns:
-            df["leido"] = 0
-        df["leido"] = df["leido"].fillna(0).astype(int)
-        return df[df["usuario"] == usuario].copy()
-    except FileNotFoundError:
-        return pd.DataFrame(columns=["usuario","titulo","fecha","leido"])
+    return notif.pendientes(usuario)
 
 def _marcar_todas_leidas(usuario: str):
-    try:
-        df_all = pd.read_csv("notificaciones.csv")
-    except FileNotFoundError:
-        return
-    if "leido" not in df_all.columns:
-        df_all["leido"] = 0
-    df_all.loc[df_all["usuario"] == usuario, "leido"] = 1
-    df_all.to_csv("notificaciones.csv", index=False)
+    # Solo actualiza las filas no leídas de este usuario
+    notif.marcar_todas_leidas(usuario)
 
 def render_home(usuario: str):
     # Portada sin navegación lateral automática y con FONDO en degradado
@@ -104,9 +91,7 @@ def render_home(usuario: str):
 
     # 1 Cargar notificaciones 
     ahora = datetime.now()
-    df_notif = _leer_notificaciones(usuario)
-    pendientes = df_notif[df_notif["leido"] == 0]
-    n_pend = int(pendientes.shape[0])
+    n_pend = notif.no_leidas(usuario)  # contador mantenido: una lectura por clave
 
 
     #st.image(LOGO_MAIN, use_column_width=True, width=220)
@@ -128,7 +113,7 @@ def render_home(usuario: str):
             if n_pend == 0:
                 st.info("No tienes notificaciones pendientes.")
             else:
-                for _, r in pendientes.iterrows():
+                for r in _leer_notificaciones(usuario):
                     st.markdown(f"**• {r.get('titulo','(sin título)')}** — {r.get('fecha','')}")
             c1, c2 = st.columns(2)
             with c1:
@@ -163,45 +148,12 @@ def render_home(usuario: str):
 # =========================
 # Lógica original (menús/permisos)
 # =========================
-USUARIOS_CSV = os.path.join(os.path.dirname(__file__), "usuarios.csv")
-PAGINAS_CSV = os.path.join(os.path.dirname(__file__), "rol_paginas.csv")
-
-# ---------- Helpers robustos para cargar/filtrar usuarios ----------
-def _load_users() -> pd.DataFrame:
-    """Lee usuarios.csv y, si no existe 'usuario' pero sí 'email',
-    crea 'usuario' como el prefijo del email."""
-    df = pd.read_csv(USUARIOS_CSV)
-    cols = {c.lower(): c for c in df.columns}
-    if "usuario" not in cols and "email" in cols:
-        c_email = cols["email"]
-        df["usuario"] = df[c_email].astype(str).str.split("@").str[0]
-    return df
-
-def _match_user(df: pd.DataFrame, input_id: str) -> pd.DataFrame:
-    """Devuelve las filas cuyo 'usuario' (prefijo) o 'email' coinciden
-    con lo que escribió el usuario (insensible a mayúsculas/espacios)."""
-    key = str(input_id).strip().lower()
-    user_key = key.split("@")[0]
-
-    cols = {c.lower(): c for c in df.columns}
-    mask = pd.Series(False, index=df.index)
-
-    if "usuario" in cols:
-        cu = cols["usuario"]
-        ser = df[cu].astype(str).str.strip().str.lower()
-        mask |= ser.eq(user_key) | ser.eq(key)           # por si guardaste email entero en 'usuario'
-    if "email" in cols:
-        ce = cols["email"]
-        mask |= df[ce].astype(str).str.strip().str.lower().eq(key)
-
-    return df[mask]
-
+# usuarios.csv / rol_paginas.csv se cargan una vez en user_directory (recarga por mtime)
 
 def validarUsuario(usuario, clave):
     """Valida usuario/clave admitiendo email o usuario."""
-    dfusuarios = _load_users()
-    cand = _match_user(dfusuarios, usuario)
-    ok = (not cand.empty) and (str(cand.iloc[0].get("clave", "")) == str(clave))
+    row = get_directorio().buscar(usuario)
+    ok = (row is not None) and (str(row.get("clave", "")) == str(clave))
     return bool(ok)
 
 
@@ -219,14 +171,12 @@ def generarMenu(usuario):
         """, unsafe_allow_html=True)
 
         st.image(LOGO_SIDEBAR, width=140) 
-        dfusuarios = _load_users()
-        dfUsuario = _match_user(dfusuarios, usuario)
+        row = get_directorio().buscar(usuario)
 
-        if dfUsuario.empty:
+        if row is None:
             st.warning("Usuario no encontrado en usuarios.csv")
             return
 
-        row = dfUsuario.iloc[0]
         nombre = row.get("nombre", usuario)
         rol = row.get("rol", "")
 
@@ -249,17 +199,15 @@ def generarMenu(usuario):
 
 def validarPagina(pagina, usuario):
     """Valida si un usuario tiene permiso a 'pagina' usando rol_paginas.csv o secrets."""
-    dfusuarios = _load_users()
-    dfPaginas = pd.read_csv(PAGINAS_CSV)
-
-    dfUsuario = _match_user(dfusuarios, usuario)
-    if dfUsuario.empty:
+    directorio = get_directorio()
+    row = directorio.buscar(usuario)
+    if row is None:
         return False
 
-    rol = dfUsuario.iloc[0].get("rol", "")
-    dfPagina = dfPaginas[(dfPaginas['pagina'].str.contains(pagina))]
-    if len(dfPagina) > 0:
-        if rol in dfPagina['roles'].values[0] or rol == "admin" or st.secrets.get("tipoPermiso","rol") == "rol":
+    rol = row.get("rol", "")
+    entrada = directorio.pagina(pagina)
+    if entrada is not None:
+        if entrada["pagina"] in directorio.permisos(rol) or st.secrets.get("tipoPermiso","rol") == "rol":
             return True
         else:
             return False
@@ -281,14 +229,12 @@ def generarMenuRoles(usuario):
         """, unsafe_allow_html=True)
 
         st.image(LOGO_SIDEBAR, width=140)
-        dfusuarios = _load_users()
-        dfPaginas = pd.read_csv(PAGINAS_CSV)
+        directorio = get_directorio()
 
-        dfUsuario = _match_user(dfusuarios, usuario)
-        if dfUsuario.empty:
+        row = directorio.buscar(usuario)
+        if row is None:
             st.warning("Usuario no encontrado en usuarios.csv")
             return
-        row = dfUsuario.iloc[0]
         nombre = row.get("nombre", usuario)
         rol = row.get("rol", "")
 
@@ -296,15 +242,15 @@ def generarMenuRoles(usuario):
         st.caption(f"Rol: {rol}")
         st.subheader("Opciones")
 
+        permitidas = directorio.permisos(rol)
         ocultar = str(st.secrets.get("ocultarOpciones", "False")) == "True"
         if ocultar:
-            if rol != 'admin':
-                dfPaginas = dfPaginas[dfPaginas['roles'].str.contains(rol)]
-            for _, r in dfPaginas.iterrows():
-                st.page_link(r['pagina'], label=r['nombre'], icon=f":material/{r['icono']}:")
+            for r in directorio.paginas:
+                if r['pagina'] in permitidas:
+                    st.page_link(r['pagina'], label=r['nombre'], icon=f":material/{r['icono']}:")
         else:
-            for _, r in dfPaginas.iterrows():
-                deshabilitarOpcion = not ((rol in r["roles"]) or rol == "admin")
+            for r in directorio.paginas:
+                deshabilitarOpcion = r['pagina'] not in permitidas
                 st.page_link(r['pagina'], label=r['nombre'], icon=f":material/{r['icono']}:", disabled=deshabilitarOpcion)
 
         btnSalir = st.button("Salir")
@@ -0,0 +1,74 @@
+# user_directory.py
+# Directorio de usuarios y permisos en memoria, construido una vez desde usuarios.csv y rol_paginas.csv.
+# Se recarga solo si cambia el mtime de alguno de los dos ficheros. Búsquedas O(1) sin pandas.
+import csv
+import os
+import threading
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+USUARIOS_CSV = os.path.join(BASE_DIR, "usuarios.csv")
+PAGINAS_CSV = os.path.join(BASE_DIR, "rol_paginas.csv")
+
+
+def _leer_csv(ruta: str) -> list[dict]:
+    with open(ruta, newline="", encoding="utf-8-sig") as f:
+        return [{(k or "").strip(): (v or "").strip() for k, v in row.items()} for row in csv.DictReader(f)]
+
+
+class Directorio:
+    def __init__(self, usuarios: list[dict], paginas: list[dict]):
+        self.usuarios = usuarios
+        self.paginas = paginas
+        self._por_email: dict[str, int] = {}
+        self._por_usuario: dict[str, int] = {}
+        for i, u in enumerate(usuarios):
+            # Claves en minúsculas; si no hay columna 'usuario' se usa el prefijo del email
+            cols = {k.lower(): v for k, v in u.items()}
+            email = cols.get("email", "").lower()
+            usuario = cols.get("usuario", "").lower() or email.split("@")[0]
+            if email:
+                self._por_email.setdefault(email, i)
+            if usuario:
+                self._por_usuario.setdefault(usuario, i)
+        self._permisos: dict[str, frozenset] = {}
+
+    def buscar(self, input_id) -> dict | None:
+        """Fila del usuario cuyo 'usuario' (prefijo) o 'email' coincide (insensible a mayúsculas/espacios)."""
+        key = str(input_id).strip().lower()
+        idx = [i for i in (self._por_usuario.get(key.split("@")[0]),
+                           self._por_usuario.get(key),
+                           self._por_email.get(key)) if i is not None]
+        return self.usuarios[min(idx)] if idx else None
+
+    def pagina(self, pagina: str) -> dict | None:
+        """Primera entrada de rol_paginas.csv cuya ruta contiene 'pagina'."""
+        for p in self.paginas:
+            if pagina in p.get("pagina", ""):
+                return p
+        return None
+
+    def permisos(self, rol: str) -> frozenset:
+        """Rutas de páginas permitidas para el rol (admin: todas). Se calcula una vez por rol."""
+        perm = self._permisos.get(rol)
+        if perm is None:
+            perm = frozenset(p["pagina"] for p in self.paginas
+                             if rol == "admin" or rol in p.get("roles", ""))
+            self._permisos[rol] = perm
+        return perm
+
+
+_lock = threading.Lock()
+_cache: dict = {"mtimes": None, "dir": None}
+
+def _mtimes() -> tuple:
+    return tuple(os.stat(r).st_mtime_ns for r in (USUARIOS_CSV, PAGINAS_CSV))
+
+def get_directorio() -> Directorio:
+    """Directorio compartido por el proceso; un stat() por llamada para detectar cambios."""
+    mt = _mtimes()
+    if _cache["mtimes"] != mt:
+        with _lock:
+            if _cache["mtimes"] != mt:
+                _cache["dir"] = Directorio(_leer_csv(USUARIOS_CSV), _leer_csv(PAGINAS_CSV))
+                _cache["mtimes"] = mt
+    return _cache["dir"]